@@ -1,84 +1,48 @@
 import streamlit as st
-import pickle
-import asyncio
 
-from json import load
-from os import remove
-from datetime import datetime
-
-from process_forecast import *
-from make_gis_map import *
-from get_measured_data import get_wind_measurements
+from forecast_provider import SnapshotProvider, RefreshScheduler
+from metrics import METRICS, METRICS_PORT
+from user_store import ProfileStore
+from get_measured_data import restore_buffers
+from pipeline import read_points, day_labels, load_forecast, load_measurements, refresh_forecast, refresh_measurements, display_forecast
 
 def load_points():
-    with open("soar_points.json", "r") as f:
-        st.session_state.soar_points = load(f)
-
-def load_forecast():
-    try:
-        #with st.spinner(text="Loading previous forecasts..."):
-        with open("forecast.pkl", "rb") as f:
-            st.session_state.forecast = pickle.load(f)
-            if 'soar_knmi' not in st.session_state.forecast or 'soar_ecmwf' not in st.session_state.forecast:
-                st.session_state.remove_forecast = True            
-    except:
-        st.session_state.remove_forecast = True
-
-def load_measurements():
-    try:
-        #with st.spinner(text="Loading previous measurements..."):
-        with open("measurements.pkl", "rb") as f:
-            st.session_state.measurements = pickle.load(f)
-    except:
-        st.session_state.remove_measurements = True
-
-async def make_forecast():
-    print("Getting forecasts")
-    #with st.spinner("Fetching forecast..."):
-    st.session_state.raw_forecast = {}
-    st.session_state.forecast = {}
+    st.session_state.soar_points = read_points()
 
-    getting_forecast_knmi = asyncio.create_task(get_forecast_soar(model="knmi_seamless"))
-    getting_forecast_ecmwf = asyncio.create_task(get_forecast_soar(model="ecmwf_ifs"))
-    
-    await getting_forecast_knmi
-    await getting_forecast_ecmwf
+# One provider per server process, shared by every session
 
-    processing_forecast_knmi = asyncio.create_task(process_soar_forecast(model="soar_knmi"))
-    processing_forecast_ecmwf = asyncio.create_task(process_soar_forecast(model="soar_ecmwf"))
+@st.cache_resource
+def forecast_provider():
+    return SnapshotProvider("forecast", refresh=refresh_forecast, max_age=3600, load=load_forecast)
 
-    await processing_forecast_knmi
-    await processing_forecast_ecmwf
+@st.cache_resource
+def measurement_provider():
+    return SnapshotProvider("measurements", refresh=refresh_measurements, max_age=900, load=load_measurements,
+                            adopt=restore_buffers)
 
-    st.session_state.forecast['time'] = datetime.now()
-    st.session_state.updating_forecast = False
-    st.session_state.update_disp_forecast = True
+@st.cache_resource
+def profile_store():
+    return ProfileStore()
 
-    with open("forecast.pkl", "wb") as f:
-        pickle.dump(st.session_state.forecast, f, protocol=pickle.HIGHEST_PROTOCOL)
-
-async def make_measurements(): 
-    #with st.spinner("Fetching measurements..."):
-    st.session_state.measurements = {}
-
-    getting_measurements = asyncio.create_task(get_wind_measurements())
-    await getting_measurements
-
-    st.session_state.measurements['time'] = datetime.now()
-    st.session_state.updating_measurements = False
-    st.session_state.update_disp_forecast = True
-    
-    with open("measurements.pkl", "wb") as f:
-        pickle.dump(st.session_state.measurements, f, protocol=pickle.HIGHEST_PROTOCOL)
+@st.cache_resource
+def refresh_scheduler():
+    # Metrics go out with every scheduler tick, to SOAR_METRICS_FILE and/or on SOAR_METRICS_PORT
+    scheduler = RefreshScheduler([forecast_provider(), measurement_provider()], after_tick=METRICS.export)
+    scheduler.start()
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT)
+    return scheduler
 
 def make_disp_forecast():
     if 'soar_knmi' in st.session_state.forecast and 'soar_ecmwf' in st.session_state.forecast:
     #with st.spinner("Processing forecast..."):
         st.session_state.update_disp_forecast = False
-        st.session_state.disp_forecast = {}
-
-        st.session_state.disp_forecast['soar_knmi'] = forecast_display_soar(st.session_state.forecast['soar_knmi'])
-        st.session_state.disp_forecast['soar_ecmwf'] = forecast_display_soar(st.session_state.forecast['soar_ecmwf'])
+        display = display_forecast(st.session_state.forecast, st.session_state.soar_points,
+                                   st.session_state.user.time_range, st.session_state.day_list)
+        st.session_state.disp_forecast = display.forecast
+        st.session_state.disp_summary = display.summary
+        # The time range disp_forecast was scored for, the slider may have moved on without a save since
+        st.session_state.disp_time_range = tuple(st.session_state.user.time_range)
         #st.session_state.disp_forecast['therm'] = forecast_display_therm(st.session_state.forecast['therm'])
 
 
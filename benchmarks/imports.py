@@ -0,0 +1,69 @@
+"""Import-time profile of the app's entry modules, each imported in a fresh interpreter.
+
+Reports the cumulative import time of every entry and of the heavy libraries it pulls in, from
+python -X importtime. backend is what every page run imports before the first paint, it must not
+load any of the LAZY libraries; the exit status is 1 when it does.
+
+    $ python -m benchmarks.imports [--repeat 3] [--entries backend tab_map_forecast]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRIES = ["backend", "tab_map_forecast", "tab_point_forecast", "tab_settings", "tab_admin", "pipeline"]
+STARTUP = "backend"
+# Loaded only by the tab or stage that needs them, streamlit itself already stubs in plotly.graph_objects
+LAZY = ["folium", "streamlit_folium", "plotly.express", "plotly.figure_factory", "openmeteo_requests", "requests_cache", "ddlpy", "scipy.spatial"]
+REPORTED = ["streamlit", "pandas", "numpy"] + LAZY
+
+def import_times(module):
+    """Cumulative microseconds per imported module name for one fresh import of module, None if it failed"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"import {module} failed: {result.stderr.strip().splitlines()[-1]}", file=sys.stderr)
+        return None
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.setdefault(name.strip(), int(cumulative))
+    return times
+
+def profile(module, repeat):
+    """Best of repeat runs, the first one also compiles and warms the file cache"""
+    runs = []
+    for _ in range(repeat + 1):
+        times = import_times(module)
+        if times is None:
+            return None
+        runs.append(times)
+    runs = runs[1:]
+    return {name: min(run.get(name, 0) for run in runs) for name in runs[0]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of the app's entry modules")
+    parser.add_argument("--entries", nargs="+", default=ENTRIES, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh imports per entry, the best one counts")
+    args = parser.parse_args(argv)
+
+    eager = []
+    print(f"{'entry':<20} {'ms':>8}  heavy imports (ms)")
+    for entry in args.entries:
+        times = profile(entry, args.repeat)
+        if times is None:
+            continue
+        heavy = ", ".join(f"{name} {times[name]/1000:.0f}" for name in REPORTED if name in times)
+        print(f"{entry:<20} {times[entry]/1000:>8.0f}  {heavy}")
+        if entry == STARTUP:
+            eager = [name for name in LAZY if name in times]
+
+    if eager:
+        print(f"{STARTUP} imports {', '.join(eager)} eagerly", file=sys.stderr)
+    return 1 if eager else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Record real Open-Meteo and RWS answers for the points in soar_points.json as benchmark fixtures.
+
+    $ python -m benchmarks.record
+"""
+import os
+import pickle
+import ddlpy
+import forecast_fetch
+import pandas as pd
+import requests
+
+from datetime import timedelta
+
+from benchmarks.synthetic import ResponseBank, as_list
+from forecast_fetch import OPENMETEO_URL, SOAR_SPEC, DAILY_SPEC, api_name, plan_request
+from get_measured_data import WIND_QUANTITIES
+from pipeline import MODELS, read_points
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+OPENMETEO_FIXTURE = os.path.join(FIXTURES, "openmeteo.pkl")
+RWS_FIXTURE = os.path.join(FIXTURES, "rws.pkl")
+
+def record_openmeteo(points):
+    bank = ResponseBank()
+    # Record the points' own coordinates, not grid cells learned into a grid_cells.pkl in the cwd
+    forecast_fetch._cells = {}
+    for model in MODELS.values():
+        _, requested, hourly = plan_request(model, [(points, SOAR_SPEC)])
+        params = {
+            "latitude": [lat for lat, lon in requested],
+            "longitude": [lon for lat, lon in requested],
+            "daily": [api_name(variable) for variable in DAILY_SPEC],
+            "hourly": hourly,
+            "models": model,
+            "timezone": "Europe/Berlin",
+            "past_days": 1,
+            "forecast_days": 7,
+        }
+        query = {key: ",".join(map(str, value)) if isinstance(value, list) else value for key, value in params.items()}
+        response = requests.get(OPENMETEO_URL, params=dict(query, format="flatbuffers"), timeout=60)
+        response.raise_for_status()
+
+        payload, pos = response.content, 0
+        for lat, lon in zip(as_list(params["latitude"]), as_list(params["longitude"])):
+            length = int.from_bytes(payload[pos:pos + 4], "little")
+            bank.messages[bank.key(params, lat, lon)] = payload[pos + 4:pos + 4 + length]
+            pos += length + 4
+    return bank.messages
+
+def record_rws(points):
+    locations = ddlpy.locations()
+    stations = sorted(set(point["station"] for point in points))
+    catalog = locations.loc[locations.index.isin(stations) & locations["Grootheid.Code"].isin(WIND_QUANTITIES)]
+    end = pd.Timestamp.now(tz="UTC")
+    start = end - timedelta(days=2)
+    frames = {}
+    for _, row in catalog.iterrows():
+        frames[(row.name, row["Grootheid.Code"])] = ddlpy.measurements(row, start, end)
+    return {"catalog": catalog, "measurements": frames}
+
+def main():
+    os.makedirs(FIXTURES, exist_ok=True)
+    points = read_points()
+    with open(OPENMETEO_FIXTURE, "wb") as f:
+        pickle.dump(record_openmeteo(points), f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(RWS_FIXTURE, "wb") as f:
+        pickle.dump(record_rws(points), f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Recorded {len(points)} points to {FIXTURES}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Local stand-in for the Open-Meteo forecast API and the RWS DDL with injected latency and faults.
+
+Open-Meteo answers come from the recorded fixtures where they exist and are synthesized for any other
+coordinate, RWS serves the recorded or synthetic catalog and measurements for any station code. Point
+the app at it through the environment:
+
+    $ python -m benchmarks.replay_server --port 8765 --latency 0.3 --jitter 0.1 --error-rate 0.05 --rate-limit 20
+    $ SOAR_OPENMETEO_URL=http://127.0.0.1:8765/v1/forecast SOAR_RWS_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import threading
+import pandas as pd
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.record import OPENMETEO_FIXTURE, RWS_FIXTURE
+from benchmarks.synthetic import ResponseBank, synthetic_catalog, synthetic_measurements
+from measurement_buffer import VALUE_COLUMN
+
+QUANTITIES = {"WINDSHD": ("Windsnelheid", "m/s"), "WINDRTG": ("Windrichting", "graad")}
+
+class Faults:
+    """Latency, jitter, error rate and a token bucket rate limit, seeded so a run can be repeated"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0
+        self._filled_at = monotonic()
+        self.counts = {"requests": 0, "errors": 0, "limited": 0}
+
+    def admit(self):
+        """None to answer normally, else the status code to fail this request with"""
+        with self._lock:
+            self.counts["requests"] += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            status = None
+            if self.rate_limit:
+                now = monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._filled_at)*self.rate_limit)
+                self._filled_at = now
+                if self._tokens < 1:
+                    status = 429
+                else:
+                    self._tokens -= 1
+            if status is None and self._random.random() < self.error_rate:
+                status = 500
+            if status == 429:
+                self.counts["limited"] += 1
+            elif status == 500:
+                self.counts["errors"] += 1
+        sleep(delay)
+        return status
+
+def load_fixture(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+class Upstream:
+    """What both APIs answer with, independent of HTTP"""
+
+    def __init__(self, seed=0):
+        recorded = load_fixture(RWS_FIXTURE) or {}
+        self.bank = ResponseBank(load_fixture(OPENMETEO_FIXTURE), seed=seed)
+        self.catalog = recorded.get("catalog", synthetic_catalog())
+        self.frames = recorded.get("measurements", {})
+        self.seed = seed
+        self._lock = threading.Lock()
+
+    def forecast(self, query):
+        params = {key: values[0] if len(values) == 1 else values for key, values in query.items()}
+        with self._lock:
+            return self.bank.payload(params)
+
+    def catalogue(self):
+        stations = self.catalog.loc[~self.catalog.index.duplicated()]
+        locations = [{"Locatie_MessageID": i, "Code": code, "Naam": row["Naam"], "Lat": float(row["Lat"]),
+                      "Lon": float(row["Lon"]), "Coordinatenstelsel": "4258"}
+                     for i, (code, row) in enumerate(stations.iterrows())]
+        metadata = [{"AquoMetadata_MessageID": j, "Grootheid": {"Code": quantity, "Omschrijving": name},
+                     "Eenheid": {"Code": unit, "Omschrijving": unit}}
+                    for j, (quantity, (name, unit)) in enumerate(QUANTITIES.items())]
+        ids = {code: i for i, code in enumerate(stations.index)}
+        pairs = [{"Locatie_MessageID": ids[code], "AquoMetaData_MessageID": list(QUANTITIES).index(quantity)}
+                 for code, quantity in zip(self.catalog.index, self.catalog["Grootheid.Code"]) if quantity in QUANTITIES]
+        return {"Succesvol": True, "LocatieLijst": locations, "AquoMetadataLijst": metadata,
+                "AquoMetadataLocatieLijst": pairs}
+
+    def observations(self, request):
+        code = request["Locatie"]["Code"]
+        quantity = request["AquoPlusWaarnemingMetadata"]["AquoMetadata"]["Grootheid"]["Code"]
+        start = pd.Timestamp(request["Periode"]["Begindatumtijd"])
+        end = pd.Timestamp(request["Periode"]["Einddatumtijd"])
+        frame = self.frames.get((code, quantity))
+        if frame is None:
+            frame = synthetic_measurements(pd.Series({"Grootheid.Code": quantity}, name=code), start, end, self.seed)
+        else:
+            frame = frame.truncate(before=start, after=end)
+        if frame.empty:
+            return None
+        name, unit = QUANTITIES.get(quantity, (quantity, ""))
+        rows = [{"Tijdstip": time.isoformat(timespec="milliseconds"), "Meetwaarde": {"Waarde_Numeriek": float(value)},
+                 "WaarnemingMetadata": {"Statuswaarde": "Ongecontroleerd", "Kwaliteitswaardecode": "00"}}
+                for time, value in zip(frame.index, frame[VALUE_COLUMN])]
+        return {"Succesvol": True, "WaarnemingenLijst": [{
+            "AquoMetadata": {"Grootheid": {"Code": quantity, "Omschrijving": name}, "Eenheid": {"Code": unit, "Omschrijving": unit}},
+            "MetingenLijst": rows}]}
+
+def make_handler(upstream, faults):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, status, body=b"", content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def fail(self, status):
+            reason = "Too many requests" if status == 429 else "Injected failure"
+            self.reply(status, json.dumps({"error": True, "reason": reason}).encode())
+
+        def handle_forecast(self, query):
+            status = faults.admit()
+            if status:
+                return self.fail(status)
+            self.reply(200, upstream.forecast(query), "application/octet-stream")
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/v1/forecast":
+                return self.handle_forecast(parse_qs(url.query))
+            if url.path == "/stats":
+                return self.reply(200, json.dumps(faults.counts).encode())
+            self.reply(404)
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if url.path == "/v1/forecast":
+                return self.handle_forecast(parse_qs(body.decode()))
+            status = faults.admit()
+            if status:
+                return self.fail(status)
+            if url.path.endswith("/OphalenCatalogus"):
+                return self.reply(200, json.dumps(upstream.catalogue()).encode())
+            if url.path.endswith("/OphalenWaarnemingen"):
+                result = upstream.observations(json.loads(body))
+                if result is None:
+                    return self.reply(204)
+                return self.reply(200, json.dumps(result).encode())
+            self.reply(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(host="127.0.0.1", port=8765, faults=None, seed=0):
+    """Start the server on a daemon thread and return it, server.server_address holds the bound port"""
+    server = ThreadingHTTPServer((host, port), make_handler(Upstream(seed), faults or Faults(seed=seed)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Open-Meteo and RWS stand-in with latency and fault injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +- seconds around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second before answering 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.rate_limit, args.seed)
+    server = serve(args.host, args.port, faults, args.seed)
+    host, port = server.server_address[:2]
+    print(f"Serving Open-Meteo on http://{host}:{port}/v1/forecast and RWS on http://{host}:{port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
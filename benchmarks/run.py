@@ -0,0 +1,203 @@
+"""Offline benchmark of every pipeline stage for growing spot counts.
+
+Open-Meteo and RWS are replaced by recorded fixtures (see benchmarks.record) for the 7 default spots
+and by synthetic answers otherwise. Each stage reports its best wall time over --repeat runs and its
+peak traced memory; --save stores the result as the baseline later runs are compared against.
+
+    $ python -m benchmarks.run [--sizes 7 100 1000 10000] [--repeat 3] [--save] [--tolerance 1.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import sys
+import tempfile
+import tracemalloc
+import types
+
+from time import perf_counter
+
+import streamlit as st
+from streamlit_folium import st_folium
+
+import forecast_fetch
+import http_client
+import get_measured_data
+import make_gis_map
+
+from benchmarks.record import OPENMETEO_FIXTURE, RWS_FIXTURE
+from benchmarks.synthetic import FixtureWeatherClient, ResponseBank, synthetic_catalog, synthetic_measurements, synthetic_points
+from make_gis_map import soar_base_map, soar_map_layer, visible_points, wind_pizza_geojson
+from pipeline import MODELS, DEFAULT_TIME_RANGE, day_labels, read_points
+from point_index import PointIndex
+from process_forecast import DISPLAY_CACHE, get_forecast_soar, process_soar_forecast, forecast_display_soar, best_spot_summary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SIZES = [7, 100, 1000, 10000]
+# Viewport of the map_view stage, the Zuid-Holland coast at zoom 10
+VIEW = (51.9, 4.0, 52.3, 4.6, 10)
+MIN_GROWTH_MB = 1.0
+
+def load_fixture(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def recorded_measurements(frames):
+    def measurements(location, start_date, end_date):
+        frame = frames.get((location.name, location["Grootheid.Code"]))
+        if frame is None:
+            return synthetic_measurements(location, start_date, end_date)
+        return frame.truncate(before=start_date, after=end_date)
+    return measurements
+
+def offline(n):
+    """Points for n spots with Open-Meteo and ddlpy answering from fixtures, returns the points"""
+    recorded = n == 7 and os.path.isfile(OPENMETEO_FIXTURE) and os.path.isfile(RWS_FIXTURE)
+    if recorded:
+        rws = load_fixture(RWS_FIXTURE)
+        http_client._openmeteo = FixtureWeatherClient(ResponseBank(load_fixture(OPENMETEO_FIXTURE), strict=True))
+        get_measured_data.ddlpy = types.SimpleNamespace(locations=lambda: rws["catalog"],
+                                                        measurements=recorded_measurements(rws["measurements"]))
+    else:
+        http_client._openmeteo = FixtureWeatherClient(ResponseBank())
+        get_measured_data.ddlpy = types.SimpleNamespace(locations=synthetic_catalog, measurements=synthetic_measurements)
+    get_measured_data._catalog = None
+    points = read_points(os.path.join(ROOT, "soar_points.json")) if recorded else synthetic_points(n)
+    return get_measured_data.assign_stations(points), recorded
+
+async def fetch(points):
+    # Every run asks for the coordinates of the points, not the grid cells an earlier run learned,
+    # so recorded answers keep matching and each run does the same work
+    forecast_fetch._cells = {}
+    tasks = {name: asyncio.create_task(get_forecast_soar(points, model=model)) for name, model in MODELS.items()}
+    return {name: await task for name, task in tasks.items()}
+
+def stages(points):
+    """(name, function of the previous results) in pipeline order"""
+    def display(results):
+        DISPLAY_CACHE.clear()
+        return forecast_display_soar({model: results["process"][model] for model in MODELS}, points, DEFAULT_TIME_RANGE)
+
+    def soar_map(results):
+        # What the map tab does on its first paint, on a bare-mode session state
+        make_gis_map.MAP_CACHE.clear()
+        make_gis_map.POINT_INDEX_CACHE.clear()
+        st.session_state.soar_points = points
+        st.session_state.disp_forecast = results["display"]
+        st.session_state.forecast_version = None
+        st.session_state.disp_time_range = DEFAULT_TIME_RANGE
+        layer = soar_map_layer(1, model="soar_knmi")
+        return st_folium(soar_base_map(), width=500, height=450, key="map_soar", feature_group_to_add=layer,
+                         returned_objects=["bounds", "zoom"])
+
+    def map_view(results):
+        index = PointIndex.of_points(points)
+        day = results["display"]["soar_knmi"][1]
+        shown, counts = visible_points(index, day, VIEW)
+        return wind_pizza_geojson([points[p] for p in shown], [day[p] for p in shown], counts)
+
+    def measurements(results):
+        get_measured_data._buffers.clear()
+        get_measured_data._stations.clear()
+        return asyncio.run(get_measured_data.get_wind_measurements(points))
+
+    return [
+        ("fetch_decode", lambda results: asyncio.run(fetch(points))),
+        ("process", lambda results: asyncio.run(process_soar_forecast(results["fetch_decode"]))),
+        ("display", display),
+        ("summary", lambda results: best_spot_summary(results["display"], points, day_labels())),
+        ("map", soar_map),
+        ("map_view", map_view),
+        ("measurements", measurements),
+    ]
+
+def run_size(n, repeat):
+    points, recorded = offline(n)
+    pipeline = stages(points)
+
+    # Warm up: synthesizes the answers, fills the catalog and grid cell files, imports lazily loaded code
+    results = {}
+    for name, stage in pipeline:
+        results[name] = stage(results)
+
+    timings = {name: float("inf") for name, _ in pipeline}
+    for _ in range(repeat):
+        for name, stage in pipeline:
+            start = perf_counter()
+            results[name] = stage(results)
+            timings[name] = min(timings[name], perf_counter() - start)
+
+    peaks = {}
+    tracemalloc.start()
+    for name, stage in pipeline:
+        # Peak above what the earlier results already hold
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        results[name] = stage(results)
+        peaks[name] = (tracemalloc.get_traced_memory()[1] - before)/2**20
+    tracemalloc.stop()
+
+    return {"recorded": recorded,
+            "stages": {name: {"seconds": timings[name], "peak_mb": peaks[name]} for name, _ in pipeline}}
+
+def compare(report, baseline, tolerance):
+    """Lines of the report with the ratio to the baseline, and whether any stage regressed beyond tolerance"""
+    lines = [f"{'spots':>6} {'stage':<14} {'seconds':>9} {'peak MB':>9} {'vs base':>8}"]
+    regressed = False
+    for size, result in report.items():
+        for stage, value in result["stages"].items():
+            # Recorded and synthetic answers of the same size are not comparable
+            base = baseline.get(size, {})
+            base = base.get("stages", {}).get(stage) if base.get("recorded") == result["recorded"] else None
+            ratio = ""
+            if base:
+                slowdown = value["seconds"]/base["seconds"] if base["seconds"] else 1
+                # Peaks of a few hundred kB swing with allocator noise, growth below MIN_GROWTH_MB is ignored
+                grown = value["peak_mb"] - base["peak_mb"] > MIN_GROWTH_MB
+                growth = value["peak_mb"]/base["peak_mb"] if base["peak_mb"] and grown else 1
+                flag = max(slowdown, growth) > tolerance
+                regressed |= flag
+                ratio = f"{slowdown:.2f}x" + (" !" if flag else "")
+            lines.append(f"{size:>6} {stage:<14} {value['seconds']:>9.4f} {value['peak_mb']:>9.1f} {ratio:>8}")
+    return lines, regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark of the forecast pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="spot counts to run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the best one counts")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with or save to")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="slowdown or memory growth that counts as a regression")
+    args = parser.parse_args(argv)
+    args.baseline = os.path.abspath(args.baseline)
+
+    # Cache files the pipeline writes (grid cells, RWS catalog) go to a scratch directory
+    report = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="soar-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            for n in args.sizes:
+                print(f"Running {n} spots", file=sys.stderr)
+                report[str(n)] = run_size(n, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    lines, regressed = compare(report, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(dict(baseline, **report), f, indent=2)
+    return 1 if regressed and not args.save else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import re
+import flatbuffers
+import numpy as np
+import pandas as pd
+
+from openmeteo_sdk.Variable import Variable
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+from measurement_buffer import VALUE_COLUMN
+
+# Coast line the synthetic spots are spread along, south to north, with the heading of the beach
+COAST = np.array([
+    (51.37, 3.37, 300), (51.49, 3.50, 222), (51.74, 3.79, 340), (51.87, 4.05, 237),
+    (52.10, 4.27, 300), (52.30, 4.47, 295), (52.56, 4.61, 279), (52.95, 4.73, 270), (53.18, 4.85, 290)
+])
+
+# Wind stations of the synthetic RWS catalog, roughly where the real coastal ones are
+STATIONS = {
+    "vlaktevanderaan": (51.50, 3.24), "brouwersdam.brouwershavensegat.2": (51.76, 3.85),
+    "stellendam.haringvlietsluizen.schuif1": (51.83, 4.04), "hoekvanholland": (51.98, 4.12),
+    "ijmuiden.havenhoofd.zuid": (52.46, 4.56), "petten.zuid": (52.77, 4.65), "denhelder.marsdiep": (52.96, 4.75),
+}
+
+def synthetic_points(n, seed=0):
+    """n soar spots along the Dutch coast, shaped like soar_points.json without a station"""
+    rng = np.random.default_rng(seed)
+    position = np.sort(rng.uniform(0, len(COAST) - 1, n))
+    segment = np.minimum(position.astype(int), len(COAST) - 2)
+    t = (position - segment)[:, None]
+    lat, lon, heading = (COAST[segment]*(1 - t) + COAST[segment + 1]*t).T
+    # Offshore coordinate a few kilometres out along the heading
+    offshore_lat = lat + 0.05*np.cos(np.deg2rad(heading))
+    offshore_lon = lon + 0.08*np.sin(np.deg2rad(heading))
+    return [{
+        "lat": round(float(lat[i]), 6), "lon": round(float(lon[i]), 6),
+        "offshore_lat": round(float(offshore_lat[i]), 6), "offshore_lon": round(float(offshore_lon[i]), 6),
+        "name": f"Spot {i}", "heading": int(heading[i]) % 360,
+        "head_range": [-45, 45], "wind_range": [int(rng.integers(15, 25)), 50], "preset": False
+    } for i in range(n)]
+
+def time_axis(past_days=1, forecast_days=7, timezone="Europe/Berlin", now=None):
+    """Epoch seconds of the first hour and the number of days Open-Meteo answers with"""
+    now = pd.Timestamp.now(tz=timezone) if now is None else now
+    start = now.normalize() - pd.Timedelta(days=past_days)
+    return int(start.timestamp()), past_days + forecast_days
+
+def variable_key(name):
+    # "wind_speed_10m" -> (Variable.wind_speed, 10, 0), "temperature_925hPa" -> (Variable.temperature, 0, 925)
+    match = re.fullmatch(r"(.+)_(\d+)(m|hPa)", name)
+    if match is None:
+        return getattr(Variable, name), 0, 0
+    variable, level, unit = match.groups()
+    return getattr(Variable, variable), (int(level) if unit == "m" else 0), (int(level) if unit == "hPa" else 0)
+
+def hourly_values(name, lat, lon, hours, rng):
+    # Smooth daily cycles with noise, in the units Open-Meteo uses
+    t = np.arange(hours)/24*2*np.pi
+    phase = rng.uniform(0, 2*np.pi)
+    if name.startswith("wind_speed"):
+        return 25 + 12*np.sin(t/3 + phase) + rng.normal(0, 3, hours)
+    if name.startswith("wind_gusts"):
+        return 35 + 15*np.sin(t/3 + phase) + rng.normal(0, 4, hours)
+    if name.startswith("wind_direction"):
+        return (260 + 60*np.sin(t/5 + phase) + rng.normal(0, 10, hours)) % 360
+    if name.startswith("temperature"):
+        return 14 - 0.1*(lat - 52) + 4*np.sin(t - 2) + rng.normal(0, 0.5, hours)
+    if name == "precipitation":
+        return np.where(rng.random(hours) < 0.1, rng.exponential(0.5, hours), 0)
+    if name == "visibility":
+        return np.where(rng.random(hours) < 0.05, 80, 24000)
+    if name == "direct_radiation":
+        return np.maximum(0, 600*np.sin(t - np.pi/2))
+    return rng.normal(0, 1, hours)
+
+def build_variables(builder, start, interval, steps, columns):
+    """VariablesWithTime table of (name, float32 or int64 values) columns, returns its offset"""
+    tables = []
+    for name, values in columns:
+        variable, altitude, pressure_level = variable_key(name)
+        vector = builder.CreateNumpyVector(values)
+        builder.StartObject(15)
+        builder.PrependUOffsetTRelativeSlot(4 if values.dtype == np.int64 else 3, vector, 0)
+        builder.PrependInt16Slot(7, pressure_level, 0)
+        builder.PrependInt16Slot(5, altitude, 0)
+        builder.PrependUint8Slot(0, variable, 0)
+        tables.append(builder.EndObject())
+
+    builder.StartVector(4, len(tables), 4)
+    for table in reversed(tables):
+        builder.PrependUOffsetTRelative(table)
+    variables = builder.EndVector()
+
+    builder.StartObject(4)
+    builder.PrependUOffsetTRelativeSlot(3, variables, 0)
+    builder.PrependInt32Slot(2, interval, 0)
+    builder.PrependInt64Slot(1, start + interval*steps, 0)
+    builder.PrependInt64Slot(0, start, 0)
+    return builder.EndObject()
+
+def openmeteo_message(lat, lon, hourly, daily, start, days, seed=0):
+    """One WeatherApiResponse FlatBuffer for a location, as Open-Meteo streams it (without the length prefix)"""
+    rng = np.random.default_rng([seed, int(abs(lat)*1e5), int(abs(lon)*1e5)])
+    builder = flatbuffers.Builder(1024)
+    hours = 24*days
+    hourly_table = build_variables(builder, start, 3600, hours,
+                                   [(name, hourly_values(name, lat, lon, hours, rng).astype(np.float32))
+                                    for name in hourly])
+    midnights = start + 86400*np.arange(days, dtype=np.int64)
+    sun = {"sunrise": midnights + 6*3600 + 1800, "sunset": midnights + 20*3600}
+    daily_table = build_variables(builder, start, 86400, days,
+                                  [(name, sun.get(name, midnights)) for name in daily])
+
+    builder.StartObject(15)
+    builder.PrependUOffsetTRelativeSlot(11, hourly_table, 0)
+    builder.PrependUOffsetTRelativeSlot(10, daily_table, 0)
+    builder.PrependFloat32Slot(1, lon, 0)
+    builder.PrependFloat32Slot(0, lat, 0)
+    builder.Finish(builder.EndObject())
+    return bytes(builder.Output())
+
+def frame(messages):
+    """Length-prefixed concatenation of messages, the body of a format=flatbuffers response"""
+    return b"".join(len(message).to_bytes(4, "little") + message for message in messages)
+
+def parse_responses(payload):
+    responses = []
+    pos = 0
+    while pos < len(payload):
+        length = int.from_bytes(payload[pos:pos + 4], "little")
+        responses.append(WeatherApiResponse.GetRootAs(payload, pos + 4))
+        pos += length + 4
+    return responses
+
+def as_list(value):
+    if isinstance(value, str):
+        return value.split(",")
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+class ResponseBank:
+    """Open-Meteo answers per (model, variables, location), recorded ones first and synthesized otherwise.
+
+    Generated messages are kept, so repeated requests only cost the lookup and the framing. A strict
+    bank only answers from its messages and raises KeyError for anything that was not recorded.
+    """
+
+    def __init__(self, messages=None, seed=0, now=None, strict=False):
+        self.messages = dict(messages or {})
+        self.seed = seed
+        self.now = now
+        self.strict = strict
+
+    def key(self, params, lat, lon):
+        return (params.get("models"), tuple(as_list(params["hourly"])), tuple(as_list(params["daily"])),
+                round(float(lat), 4), round(float(lon), 4))
+
+    def message(self, params, lat, lon):
+        key = self.key(params, lat, lon)
+        if key not in self.messages:
+            if self.strict:
+                raise KeyError(f"No recorded Open-Meteo answer for {key}")
+            start, days = time_axis(int(params.get("past_days", 1)), int(params.get("forecast_days", 7)),
+                                    params.get("timezone", "Europe/Berlin"), self.now)
+            self.messages[key] = openmeteo_message(float(lat), float(lon), key[1], key[2], start, days, self.seed)
+        return self.messages[key]
+
+    def payload(self, params):
+        return frame([self.message(params, lat, lon)
+                      for lat, lon in zip(as_list(params["latitude"]), as_list(params["longitude"]))])
+
+class FixtureWeatherClient:
+    """Drop-in for http_client.CachedWeatherClient that answers from a ResponseBank without any network"""
+
+    def __init__(self, bank):
+        self.bank = bank
+
+    def weather_api(self, url, params):
+        return parse_responses(self.bank.payload(params))
+
+def synthetic_catalog(stations=STATIONS):
+    """The wind rows of a ddlpy.locations() frame for the given {code: (lat, lon)}"""
+    rows = [{"Code": code, "Naam": code.replace(".", " ").title(), "Lat": lat, "Lon": lon, "Grootheid.Code": quantity}
+            for code, (lat, lon) in stations.items() for quantity in ["WINDSHD", "WINDRTG"]]
+    return pd.DataFrame(rows).set_index("Code")
+
+def synthetic_measurements(location, start_date, end_date, seed=0):
+    """A ddlpy.measurements() frame of 10 minute values for one catalog row"""
+    index = pd.date_range(pd.Timestamp(start_date).ceil("10min"), pd.Timestamp(end_date), freq="10min")
+    rng = np.random.default_rng([seed, sum(map(ord, location.name)), len(index)])
+    t = np.arange(len(index))/144*2*np.pi
+    if location["Grootheid.Code"] == "WINDRTG":
+        values = (260 + 40*np.sin(t/2) + rng.normal(0, 8, len(index))) % 360
+    else:
+        values = np.maximum(0, 8 + 3*np.sin(t/2) + rng.normal(0, 1, len(index)))
+    return pd.DataFrame({VALUE_COLUMN: values}, index=index)
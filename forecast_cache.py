@@ -0,0 +1,180 @@
+import json
+import mmap
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+
+from contextlib import contextmanager
+from datetime import datetime, date
+
+from forecast_store import ForecastStore, ModelView, block_hashes, build_forecast_store, to_ns
+
+FORECAST_CACHE = "forecast.cache"
+LEGACY_FORECAST = "forecast.pkl"
+
+MAGIC = b"SOARFC\r\n"
+FORMAT_VERSION = 2
+ALIGN = 64
+BLOCKS = ["time", "data", "sunrise", "sunset", "starts", "stops", "hashes"]
+
+# File layout: MAGIC | uint64 header length | JSON header | blocks, each aligned to ALIGN bytes.
+# The header records dtype, shape and offset of every block so a reader can map them in place.
+
+# mkstemp creates files as 0600, snapshots get the mode a plain open() would give them so a
+# pipeline.py cron job running as another user writes files the app can read
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+@contextmanager
+def atomic_write(path):
+    """Binary file on a temp file next to path, renamed over path once the block completes.
+
+    Readers see the old file or the new one, never a partly written one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=f".{os.path.basename(path)}-", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def write_cache(path, header, blocks):
+    """Write header and blocks to a temp file next to path and atomically rename it over path"""
+    header = dict(header, blocks={})
+    offset = 0
+    for name in BLOCKS:
+        array = np.ascontiguousarray(blocks[name])
+        header["blocks"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    raw_header = json.dumps(header).encode()
+    start = -(-(len(MAGIC) + 8 + len(raw_header)) // ALIGN) * ALIGN
+
+    with atomic_write(path) as f:
+        f.write(MAGIC)
+        f.write(len(raw_header).to_bytes(8, "little"))
+        f.write(raw_header)
+        for name in BLOCKS:
+            f.seek(start + header["blocks"][name]["offset"])
+            f.write(np.ascontiguousarray(blocks[name]).tobytes())
+
+def read_cache(path):
+    """Map the cache file read-only, blocks are numpy views on the mapping"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a forecast cache")
+        length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(length))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+    blocks = {}
+    for name, spec in header["blocks"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        if count == 0:
+            blocks[name] = np.zeros(spec["shape"], dtype=dtype)
+            continue
+        blocks[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=start + spec["offset"]).reshape(spec["shape"])
+    return header, blocks
+
+def save_forecast_cache(forecast, path=FORECAST_CACHE):
+    store = next(value.store for value in forecast.values() if isinstance(value, ModelView))
+    header = {
+        "version": FORMAT_VERSION,
+        "models": store.models,
+        "variables": store.variables,
+        "dates": [day.isoformat() for day in store.dates],
+        "time": forecast["time"].isoformat(),
+        "points": forecast.get("points")
+    }
+    write_cache(path, header, {name: getattr(store, name) for name in BLOCKS})
+
+def load_forecast_cache(variables, path=FORECAST_CACHE, points=None):
+    """Return the forecast dict from the cache, migrating the file in place if its schema is outdated.
+
+    Files written before caches recorded their point set are stamped with the points fingerprint.
+    """
+    header, blocks = read_cache(path)
+    unstamped = header.get("points") is None and points is not None
+    if header["version"] != FORMAT_VERSION or header["variables"] != variables or unstamped:
+        header, blocks = migrate(header, blocks, variables)
+        if unstamped:
+            header["points"] = points
+        write_cache(path, header, blocks)
+        header, blocks = read_cache(path)
+
+    store = ForecastStore(header["models"], header["variables"], [date.fromisoformat(day) for day in header["dates"]],
+                          *[blocks[name] for name in BLOCKS])
+    forecast = {model: store.model(model) for model in store.models}
+    forecast["time"] = datetime.fromisoformat(header["time"])
+    forecast["points"] = header.get("points")
+    return forecast
+
+def add_block_hashes(header, blocks):
+    return dict(header, version=2), dict(blocks, hashes=block_hashes(*[blocks[name] for name in BLOCKS[:-1]]))
+
+# Steps upgrading a header/blocks pair from the keyed version to the next one
+MIGRATIONS = {1: add_block_hashes}
+
+def migrate(header, blocks, variables):
+    if header["version"] > FORMAT_VERSION:
+        raise ValueError(f"forecast cache version {header['version']} is newer than {FORMAT_VERSION}")
+    header, blocks = dict(header), dict(blocks)
+    while header["version"] < FORMAT_VERSION:
+        header, blocks = MIGRATIONS[header["version"]](header, blocks)
+
+    if header["variables"] != variables:
+        # Variables are matched by name, new ones start out empty until the next refresh
+        data = np.full(blocks["data"].shape[:3] + (len(variables),), np.nan, dtype=np.float32)
+        for v, variable in enumerate(variables):
+            if variable in header["variables"]:
+                data[..., v] = blocks["data"][..., header["variables"].index(variable)]
+        blocks["data"] = data
+        blocks["hashes"] = block_hashes(*[blocks[name] for name in BLOCKS[:-1]])
+        header["variables"] = list(variables)
+    return header, blocks
+
+def migrate_legacy_forecast(variables, legacy_path=LEGACY_FORECAST, path=FORECAST_CACHE, points=None):
+    """Convert forecast.pkl into the columnar cache, stamped with the points fingerprint, and remove it"""
+    with open(legacy_path, "rb") as f:
+        forecast = pickle.load(f)
+
+    if not any(isinstance(value, ModelView) for value in forecast.values()):
+        forecast = legacy_to_store(forecast, variables)
+    forecast.setdefault("points", points)
+    save_forecast_cache(forecast, path)
+    os.remove(legacy_path)
+
+def legacy_to_store(forecast, variables):
+    # Pre-store pickles hold [day][point] dicts, stitch the day windows back into one series per point
+    models = [key for key in forecast if key != "time"]
+    raw_forecasts = {}
+    for model in models:
+        days = forecast[model]
+        raw_forecasts[model] = []
+        for p in range(len(days[0])):
+            sunrise = pd.DatetimeIndex([day[p]["sunrise"] for day in days])
+            hourly = {"date": pd.to_datetime(np.concatenate([to_ns(pd.DatetimeIndex(day[p]["time"])) for day in days]),
+                                             utc=True)}
+            for variable in variables:
+                hourly[variable] = np.concatenate([np.asarray(day[p].get(variable, [np.nan]*len(day[p]["time"])),
+                                                              dtype=np.float32) for day in days])
+            daily = {"date": sunrise, "sunrise": sunrise, "sunset": pd.DatetimeIndex([day[p]["sunset"] for day in days])}
+            raw_forecasts[model].append({"id": p, "daily_data": daily, "hourly_data": hourly})
+
+    dates = [day.date() for day in raw_forecasts[models[0]][0]["daily_data"]["date"]]
+    store = build_forecast_store(raw_forecasts, dates, variables)
+    legacy = {model: store.model(model) for model in models}
+    legacy["time"] = forecast["time"]
+    return legacy
@@ -0,0 +1,213 @@
+import os
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from openmeteo_sdk.Variable import Variable
+
+from http_client import OPENMETEO_URL, openmeteo_client
+from metrics import METRICS
+
+GRID_CELLS = "grid_cells.pkl"
+# Locations per request, keeps the query string well below URL length limits with every variable listed
+MAX_LOCATIONS = 100
+
+# Chunks of one request run side by side, separate from the pool the per-model fetches run on
+CHUNK_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="openmeteo-chunk")
+
+# name: key in hourly_data, variable/level: Open-Meteo variable and its height or pressure level,
+# role: which coordinate of a point it is requested at, dtype: array type it is decoded into
+VariableSpec = namedtuple("VariableSpec", ["name", "variable", "level", "role", "dtype"])
+
+SOAR_SPEC = [
+    VariableSpec("temperature", "temperature", "2m", "onshore", np.float32),
+    VariableSpec("precipitation", "precipitation", None, "onshore", np.float32),
+    VariableSpec("visibility", "visibility", None, "onshore", np.float32),
+    VariableSpec("wind_speed", "wind_speed", "10m", "offshore", np.float32),
+    VariableSpec("wind_direction", "wind_direction", "10m", "offshore", np.float32),
+    VariableSpec("wind_gusts", "wind_gusts", "10m", "offshore", np.float32),
+]
+
+THERM_SPEC = [
+    VariableSpec("temperature", "temperature", "2m", "onshore", np.float32),
+    VariableSpec("temperature_110m", "temperature", "1000hPa", "onshore", np.float32),
+    VariableSpec("temperature_800m", "temperature", "925hPa", "onshore", np.float32),
+    VariableSpec("temperature_1500m", "temperature", "850hPa", "onshore", np.float32),
+    VariableSpec("temperature_3000m", "temperature", "700hPa", "onshore", np.float32),
+    VariableSpec("solar_irradiation", "direct_radiation", None, "onshore", np.float32),
+    VariableSpec("precipitation", "precipitation", None, "onshore", np.float32),
+    VariableSpec("visibility", "visibility", None, "onshore", np.float32),
+    VariableSpec("wind_speed", "wind_speed", "10m", "onshore", np.float32),
+    VariableSpec("wind_direction", "wind_direction", "10m", "onshore", np.float32),
+    VariableSpec("wind_gusts", "wind_gusts", "10m", "onshore", np.float32),
+]
+
+# Daily values always describe the point itself
+DAILY_SPEC = [
+    VariableSpec("sunrise", "sunrise", None, "onshore", np.int64),
+    VariableSpec("sunset", "sunset", None, "onshore", np.int64),
+]
+
+ROLE_COORDINATES = {"onshore": ("lat", "lon"), "offshore": ("offshore_lat", "offshore_lon")}
+
+def api_name(spec):
+    return spec.variable if spec.level is None else f"{spec.variable}_{spec.level}"
+
+def response_key(spec):
+    # How the variable identifies itself in a FlatBuffers response: (variable, altitude m, pressure level hPa)
+    level = spec.level or ""
+    if level.endswith("hPa"):
+        return getattr(Variable, spec.variable), 0, int(level[:-3])
+    return getattr(Variable, spec.variable), int(level[:-1] or 0), 0
+
+def coordinate(point, role):
+    lat, lon = ROLE_COORDINATES[role]
+    return (float(point[lat]), float(point[lon]))
+
+# (model, lat, lon) -> the model grid cell (lat, lon) Open-Meteo answered with for that coordinate
+_cells = None
+_cells_lock = threading.Lock()
+
+def grid_cells():
+    global _cells
+    if _cells is None:
+        try:
+            with open(GRID_CELLS, "rb") as f:
+                _cells = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            _cells = {}
+    return _cells
+
+def grid_cell(model, coordinate):
+    """The grid cell a coordinate falls in, the coordinate itself until the model has answered for it once"""
+    return grid_cells().get((model,) + coordinate, coordinate)
+
+def remember_cells(model, requested, responses):
+    cells = grid_cells()
+    new = {}
+    for coordinate, response in zip(requested, responses):
+        cell = (float(response.Latitude()), float(response.Longitude()))
+        for key in [(model,) + coordinate, (model,) + cell]:
+            if cells.get(key) != cell:
+                new[key] = cell
+    if not new:
+        return
+    with _cells_lock:
+        cells.update(new)
+        with open(GRID_CELLS + ".tmp", "wb") as f:
+            pickle.dump(dict(cells), f)
+        os.replace(GRID_CELLS + ".tmp", GRID_CELLS)
+
+def plan_request(model, jobs):
+    """Grid cells and variables of all (points, spec) jobs of one model.
+
+    Returns the column of every coordinate, the cells to request (one per column) and the hourly variables.
+    """
+    columns = {}
+    cells = {}
+    hourly = []
+    for points, spec in jobs:
+        for variable in spec + DAILY_SPEC:
+            for point in points:
+                location = coordinate(point, variable.role)
+                if location not in columns:
+                    columns[location] = cells.setdefault(grid_cell(model, location), len(cells))
+        for variable in spec:
+            if api_name(variable) not in hourly:
+                hourly.append(api_name(variable))
+    return columns, list(cells), hourly
+
+def decode_time(variables):
+    return pd.date_range(
+        start=pd.to_datetime(variables.Time(), unit="s", utc=True),
+        end=pd.to_datetime(variables.TimeEnd(), unit="s", utc=True),
+        freq=pd.Timedelta(seconds=variables.Interval()),
+        inclusive="left"
+    )
+
+def decode_into(variables, steps, targets, values_of):
+    # targets maps a response key to the (array, row) pairs fed by this coordinate, steps is the number of time steps kept
+    for j in range(variables.VariablesLength()):
+        variable = variables.Variables(j)
+        key = (variable.Variable(), variable.Altitude(), variable.PressureLevel())
+        rows = targets.get(key)
+        if not rows:
+            continue
+        # Decoded once, a cell feeding both onshore and offshore rows shares the values
+        values = values_of(variable)[:steps]
+        for array, row in rows:
+            array[row, :steps] = values
+
+def fetch_chunked(params, roles):
+    """weather_api for any number of locations, split into MAX_LOCATIONS sized requests"""
+    fetch = METRICS.timed("http_fetch", openmeteo_client().weather_api, model=params["models"], role=roles)
+    chunks = [dict(params, latitude=params["latitude"][i:i + MAX_LOCATIONS],
+                   longitude=params["longitude"][i:i + MAX_LOCATIONS])
+              for i in range(0, len(params["latitude"]), MAX_LOCATIONS)]
+    if len(chunks) == 1:
+        return fetch(OPENMETEO_URL, params=params)
+    return [response for responses in CHUNK_POOL.map(lambda chunk: fetch(OPENMETEO_URL, params=chunk), chunks)
+            for response in responses]
+
+def fetch_forecast(model, jobs, past_days=1, forecast_days=7):
+    """Fetch every (points, spec) job of one model in a single multi-location request.
+
+    Coordinates that share a model grid cell, whether across roles, points or jobs, are requested once
+    and fanned out to everything that uses them. Values are decoded by
+    variable name and level straight into one preallocated (point, hour) array per variable.
+    Returns a list per job of per-point {"id", "daily_data", "hourly_data"} dicts.
+    """
+    columns, requested, hourly = plan_request(model, jobs)
+    params = {
+        "latitude": [lat for lat, lon in requested],
+        "longitude": [lon for lat, lon in requested],
+        "daily": [api_name(variable) for variable in DAILY_SPEC],
+        "hourly": hourly,
+        "models": model,
+        "timezone": "Europe/Berlin",
+        "past_days": past_days,
+        "forecast_days": forecast_days,
+    }
+    # Onshore and offshore coordinates share the request, its span is labelled with both roles
+    roles = "+".join(sorted(set(variable.role for points, spec in jobs for variable in spec)))
+    responses = fetch_chunked(params, roles)
+    remember_cells(model, requested, responses)
+
+    hours = decode_time(responses[0].Hourly())
+    days = decode_time(responses[0].Daily())
+
+    hourly_targets = [{} for _ in requested]
+    daily_targets = [{} for _ in requested]
+    arrays = []
+    for points, spec in jobs:
+        job_arrays = {}
+        for variable, targets, length in [(v, hourly_targets, len(hours)) for v in spec] \
+                                        + [(v, daily_targets, len(days)) for v in DAILY_SPEC]:
+            fill = np.nan if np.issubdtype(variable.dtype, np.floating) else 0
+            job_arrays[variable.name] = np.full((len(points), length), fill, dtype=variable.dtype)
+            for row, point in enumerate(points):
+                c = columns[coordinate(point, variable.role)]
+                targets[c].setdefault(response_key(variable), []).append((job_arrays[variable.name], row))
+        arrays.append(job_arrays)
+
+    with METRICS.span("decode", model=model):
+        for c, response in enumerate(responses):
+            decode_into(response.Hourly(), len(hours), hourly_targets[c], lambda v: v.ValuesAsNumpy())
+            decode_into(response.Daily(), len(days), daily_targets[c], lambda v: v.ValuesInt64AsNumpy())
+
+    forecasts = []
+    for (points, spec), job_arrays in zip(jobs, arrays):
+        forecast = []
+        for row in range(len(points)):
+            hourly_data = {"date": hours}
+            for variable in spec:
+                hourly_data[variable.name] = job_arrays[variable.name][row]
+            daily_data = {"date": days}
+            for variable in DAILY_SPEC:
+                daily_data[variable.name] = pd.to_datetime(job_arrays[variable.name][row], unit="s", utc=True)
+            forecast.append({"id": row, "daily_data": daily_data, "hourly_data": hourly_data})
+        forecasts.append(forecast)
+    return forecasts
@@ -0,0 +1,132 @@
+import threading
+import traceback
+
+from collections import namedtuple
+from datetime import datetime
+
+from metrics import METRICS
+
+Snapshot = namedtuple("Snapshot", ["data", "time", "version"])
+
+class SnapshotProvider:
+    """Process-wide latest snapshot of some data, refreshed by at most one caller at a time.
+
+    Every session reads the same immutable snapshot. When it is older than max_age the first
+    caller of get() runs the refresh while concurrent callers wait on the lock and reuse its
+    result. latest() never waits once a snapshot exists, it serves the last good one. A fresh
+    snapshot already written by another process, such as a pipeline.py cron job, is loaded
+    instead of refreshing; adopt(data) is called with every loaded snapshot that becomes current.
+    """
+
+    def __init__(self, name, refresh, max_age, load=None, adopt=None, retry_after=60):
+        self.name = name
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._refresh = refresh
+        self._load = load
+        self._adopt = adopt
+        self._lock = threading.Lock()
+        self._failed_at = None
+        self.snapshot = None
+        METRICS.gauge("snapshot_age_seconds", self.age, snapshot=name)
+        METRICS.gauge("snapshot_version", lambda: self.version, snapshot=name)
+        if load is not None:
+            data = load()
+            if data is not None:
+                self._adopted(data)
+                self.snapshot = Snapshot(data, data['time'], 0)
+
+    @property
+    def version(self):
+        return None if self.snapshot is None else self.snapshot.version
+
+    def age(self):
+        if self.snapshot is None:
+            return None
+        return (datetime.now() - self.snapshot.time).total_seconds()
+
+    def is_stale(self):
+        return self.snapshot is None or self.age() >= self.max_age
+
+    def _should_refresh(self):
+        # After a failed refresh keep serving the old snapshot for a while instead of retrying every rerun
+        if self._failed_at is not None and (datetime.now() - self._failed_at).total_seconds() < self.retry_after:
+            return self.snapshot is None
+        return self.is_stale()
+
+    def _stored(self):
+        if self._load is None:
+            return None
+        data = self._load()
+        if data is None or (self.snapshot is not None and data['time'] <= self.snapshot.time) \
+        or (datetime.now() - data['time']).total_seconds() >= self.max_age:
+            return None
+        return data
+
+    def _adopted(self, data):
+        # A loaded snapshot becomes the current one, refresh state living outside it follows
+        if self._adopt is not None:
+            self._adopt(data)
+
+    def latest(self):
+        if self.snapshot is None:
+            return self.get()
+        return self.snapshot
+
+    def get(self):
+        if not self._should_refresh():
+            return self.snapshot
+
+        with self._lock:
+            # Another session may have refreshed while this one was waiting
+            if not self._should_refresh():
+                return self.snapshot
+            print(f"Refreshing {self.name}")
+            try:
+                with METRICS.span("refresh", snapshot=self.name):
+                    data = self._stored()
+                    if data is None:
+                        data = self._refresh()
+                    else:
+                        self._adopted(data)
+            except Exception:
+                METRICS.count("refresh_failures", snapshot=self.name)
+                self._failed_at = datetime.now()
+                if self.snapshot is None:
+                    raise
+                print(f"Refreshing {self.name} failed, keeping previous snapshot \n")
+                traceback.print_exc()
+                return self.snapshot
+            version = 1 if self.snapshot is None else self.snapshot.version + 1
+            self.snapshot = Snapshot(data, data['time'], version)
+            self._failed_at = None
+        return self.snapshot
+
+class RefreshScheduler(threading.Thread):
+    """Daemon thread refreshing providers on their own cadence, so page reruns never wait on upstream APIs"""
+
+    def __init__(self, providers, tick=30, after_tick=None):
+        super().__init__(name="refresh-scheduler", daemon=True)
+        self.providers = providers
+        self.tick = tick
+        self.after_tick = after_tick
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            for provider in self.providers:
+                try:
+                    provider.get()
+                except Exception:
+                    print(f"Background refresh of {provider.name} failed \n")
+                    traceback.print_exc()
+            if self.after_tick is not None:
+                try:
+                    self.after_tick()
+                except Exception:
+                    traceback.print_exc()
+            if self._stop_event.wait(self.tick):
+                return
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,150 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+HOUR_NS = 3_600_000_000_000
+ALIASES = {"wind_speed_measured": "wind_speed"}
+
+class ForecastStore:
+    """All models and points on one shared UTC hour axis, data shaped (model, point, hour, variable)
+
+    hashes holds a content hash of every (model, point, day) window so unchanged blocks can be recognised.
+    """
+    __slots__ = ("models", "variables", "dates", "time", "data", "sunrise", "sunset", "starts", "stops", "hashes")
+
+    def __init__(self, models, variables, dates, time, data, sunrise, sunset, starts, stops, hashes):
+        self.models = models
+        self.variables = variables
+        self.dates = dates
+        self.time = time
+        self.data = data
+        self.sunrise = sunrise
+        self.sunset = sunset
+        self.starts = starts
+        self.stops = stops
+        self.hashes = hashes
+
+    def freeze(self):
+        # Stores are shared between sessions, nobody may write into them after they are built
+        for array in (self.time, self.data, self.sunrise, self.sunset, self.starts, self.stops, self.hashes):
+            array.flags.writeable = False
+
+    def model(self, name):
+        return ModelView(self, self.models.index(name))
+
+    def variable(self, name):
+        return self.variables.index(ALIASES.get(name, name))
+
+    def __len__(self):
+        return len(self.models)
+
+class ModelView:
+    __slots__ = ("store", "m")
+
+    def __init__(self, store, m):
+        self.store = store
+        self.m = m
+
+    def __len__(self):
+        return len(self.store.dates)
+
+    def __getitem__(self, day):
+        return DayView(self.store, self.m, range(len(self))[day])
+
+    def __iter__(self):
+        return (self[day] for day in range(len(self)))
+
+class DayView:
+    __slots__ = ("store", "m", "day")
+
+    def __init__(self, store, m, day):
+        self.store = store
+        self.m = m
+        self.day = day
+
+    def __len__(self):
+        return self.store.data.shape[1]
+
+    def __getitem__(self, p):
+        return PointDayView(self.store, self.m, range(len(self))[p], self.day)
+
+    def __iter__(self):
+        return (self[p] for p in range(len(self)))
+
+class PointDayView:
+    """Sunrise-1h..sunset+2h window of one point, variables are views on the store"""
+    __slots__ = ("store", "m", "p", "day")
+
+    def __init__(self, store, m, p, day):
+        self.store = store
+        self.m = m
+        self.p = p
+        self.day = day
+
+    def hash(self):
+        return int(self.store.hashes[self.m, self.p, self.day])
+
+    def bounds(self):
+        return self.store.starts[self.m, self.p, self.day], self.store.stops[self.m, self.p, self.day]
+
+    def keys(self):
+        return ["sunrise", "sunset", "time"] + self.store.variables + list(ALIASES)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __getitem__(self, key):
+        store = self.store
+        if key == "sunrise" or key == "sunset":
+            return pd.Timestamp(getattr(store, key)[self.m, self.p, self.day], tz="UTC")
+        start, stop = self.bounds()
+        if key == "time":
+            return pd.to_datetime(store.time[start:stop], utc=True)
+        return store.data[self.m, self.p, start:stop, store.variable(key)]
+
+def to_ns(index):
+    return np.asarray(index.as_unit("ns").asi8)
+
+def block_hashes(time, data, sunrise, sunset, starts, stops):
+    """64 bit content hash of the hours, values and sun times of every (model, point, day) window"""
+    hashes = np.zeros(starts.shape, dtype=np.uint64)
+    for m, p, day in np.ndindex(starts.shape):
+        start, stop = starts[m, p, day], stops[m, p, day]
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(time[start:stop].tobytes())
+        digest.update(np.ascontiguousarray(data[m, p, start:stop]).tobytes())
+        digest.update(sunrise[m, p, day].tobytes())
+        digest.update(sunset[m, p, day].tobytes())
+        hashes[m, p, day] = int.from_bytes(digest.digest(), "little")
+    return hashes
+
+def build_forecast_store(raw_forecasts, dates, variables):
+    """Pack decoded per-point forecasts ({model: [point, ...]}) into one ForecastStore"""
+    models = list(raw_forecasts)
+    n_points = max(len(raw_forecasts[model]) for model in models)
+
+    hours = [to_ns(pf["hourly_data"]["date"]) for model in models for pf in raw_forecasts[model]]
+    time = np.unique(np.concatenate(hours)) if hours else np.zeros(0, dtype=np.int64)
+
+    data = np.full((len(models), n_points, len(time), len(variables)), np.nan, dtype=np.float32)
+    sunrise = np.zeros((len(models), n_points, len(dates)), dtype=np.int64)
+    sunset = np.zeros((len(models), n_points, len(dates)), dtype=np.int64)
+
+    for m, model in enumerate(models):
+        for p, point_forecast in enumerate(raw_forecasts[model]):
+            hourly = point_forecast["hourly_data"]
+            daily = point_forecast["daily_data"]
+            pos = np.searchsorted(time, to_ns(hourly["date"]))
+            for v, variable in enumerate(variables):
+                data[m, p, pos, v] = hourly[variable]
+
+            day_pos = {date.date(): i for i, date in enumerate(daily["date"])}
+            order = [day_pos[date] for date in dates]
+            sunrise[m, p] = to_ns(daily["sunrise"])[order]
+            sunset[m, p] = to_ns(daily["sunset"])[order]
+
+    starts = np.searchsorted(time, sunrise - HOUR_NS, side="left").astype(np.int32)
+    stops = np.searchsorted(time, sunset + 2*HOUR_NS, side="right").astype(np.int32)
+
+    hashes = block_hashes(time, data, sunrise, sunset, starts, stops)
+    return ForecastStore(models, list(variables), list(dates), time, data, sunrise, sunset, starts, stops, hashes)
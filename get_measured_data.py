@@ -1,37 +1,172 @@
 from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import datetime as dt
-import ddlpy
+import asyncio
+import pickle
 import pandas as pd
-import streamlit as st
-
-async def get_wind_measurements():
-    locations = ddlpy.locations()
-
-    bool_stations = locations.index.isin(["ijmuiden.havenhoofd.zuid", "stellendam.haringvlietsluizen.schuif1", 
-                                      "vlaktevanderaan", "brouwersdam.brouwershavensegat.2"])
-    bool_grootheid_wind = locations["Grootheid.Code"].isin(["WINDSHD", "WINDRTG"])
-
-    selected = locations.loc[
-        bool_stations
-        & bool_grootheid_wind
-        ]
-
-    dates = (dt.datetime.combine((datetime.now() - timedelta(days=1)).date(), dt.time.min), datetime.now())
 
+from http_client import rws_session
+from metrics import METRICS
+from measurement_buffer import MeasurementRing, VALUE_COLUMN
+from measurement_index import StationIndex
+from point_index import PointIndex
+
+MEASUREMENT_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rws")
+
+WIND_QUANTITIES = ["WINDSHD", "WINDRTG"]
+CATALOG_CACHE = "rws_catalog.pkl"
+CATALOG_TTL = timedelta(days=1)
+
+# Imported by rws() on the first RWS request
+ddlpy = None
+
+def rws():
+    """ddlpy with its requests routed through the pooled session"""
+    global ddlpy
+    rws_session()
+    if ddlpy is None:
+        import ddlpy
+    return ddlpy
+
+# Wind part of the RWS catalog indexed by (station code, Grootheid), kept in memory and on disk
+_catalog = None
+
+def load_catalog():
+    global _catalog
+    if _catalog is not None and datetime.now() - _catalog['time'] < CATALOG_TTL:
+        return _catalog
+
+    try:
+        with open(CATALOG_CACHE, "rb") as f:
+            cached = pickle.load(f)
+        if datetime.now() - cached['time'] < CATALOG_TTL:
+            _catalog = cached
+            return _catalog
+    except Exception:
+        pass
+
+    locations = rws().locations()
+    locations = locations.loc[locations["Grootheid.Code"].isin(WIND_QUANTITIES)]
+
+    index = {}
+    for pos, key in enumerate(zip(locations.index, locations["Grootheid.Code"])):
+        index.setdefault(key, []).append(pos)
+
+    _catalog = {'time': datetime.now(), 'locations': locations, 'index': index}
+    with open(CATALOG_CACHE, "wb") as f:
+        pickle.dump(_catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return _catalog
+
+def station_index(catalog):
+    """Codes of the stations measuring wind speed and a PointIndex over their coordinates, built once per catalog"""
+    if 'stations' not in catalog:
+        speed = catalog['locations'].loc[catalog['locations']["Grootheid.Code"] == "WINDSHD"]
+        speed = speed.loc[~speed.index.duplicated()]
+        catalog['stations'] = (list(speed.index), PointIndex(speed["Lat"].to_numpy(), speed["Lon"].to_numpy()))
+    return catalog['stations']
+
+def assign_stations(points):
+    """Fill in the nearest RWS wind station of every point that has none, one tree query for all of them"""
+    missing = [point for point in points if not point.get("station")]
+    if not missing:
+        return points
+    codes, index = station_index(load_catalog())
+    nearest = index.nearest([point["lat"] for point in missing], [point["lon"] for point in missing])
+    for point, pos in zip(missing, nearest):
+        point["station"] = codes[pos]
+    return points
+
+def select_series(catalog, stations):
+    rows = [pos for station in stations for quantity in WIND_QUANTITIES
+            for pos in catalog['index'].get((station, quantity), [])]
+    return [catalog['locations'].iloc[pos] for pos in rows]
+
+# Ring buffers per (station, quantity) and station metadata, new rows are appended on every refresh
+_buffers = {}
+_stations = {}
+
+def stored_snapshot(measurements):
+    """Snapshot of a stored measurements dict, the ring buffers are left alone until it is adopted"""
     data = {}
-
-    # provide a single row of the locations dataframe to ddlpy.measurements
-    for index, row in selected.iterrows():
-        measurements = ddlpy.measurements(row, start_date=dates[0], end_date=dates[1])
+    for station, stored in measurements.items():
+        if not isinstance(stored, dict):
+            continue
+        data[station] = {key: stored[key] for key in ['name', 'lat', 'lon']}
+        rings = {}
+        for quantity in WIND_QUANTITIES:
+            if quantity not in stored:
+                continue
+            if isinstance(stored[quantity], MeasurementRing):
+                ring = stored[quantity].copy()
+            else:
+                ring = MeasurementRing()
+                ring.append(stored[quantity].index.as_unit("s").asi8, stored[quantity][VALUE_COLUMN].to_numpy())
+            data[station][quantity] = rings[quantity] = ring
+        data[station]["index"] = StationIndex(rings)
+    return data
+
+def restore_buffers(snapshot):
+    """Seed the ring buffers from an adopted snapshot so ingestion continues where it stopped"""
+    for station, data in snapshot.items():
+        if not isinstance(data, dict):
+            continue
+        _stations[station] = {key: data[key] for key in ['name', 'lat', 'lon']}
+        for quantity in WIND_QUANTITIES:
+            if quantity in data:
+                _buffers[(station, quantity)] = data[quantity].copy()
+
+def buffer_snapshot():
+    # Copies, sessions keep reading a snapshot while the next refresh appends
+    data = {}
+    rings = {}
+    for (station, quantity), ring in _buffers.items():
+        if ring.last is None:
+            continue
+        if station not in data:
+            data[station] = dict(_stations[station])
+            rings[station] = {}
+        data[station][quantity] = rings[station][quantity] = ring.copy()
+    for station in data:
+        data[station]["index"] = StationIndex(rings[station])
+    return data
+
+async def get_wind_measurements(points):
+    rws()
+    catalog = load_catalog()
+    stations = sorted(set(point["station"] for point in points if point.get("station")))
+    selected = select_series(catalog, stations)
+
+    # Only ask for rows newer than what is stored, the first time from yesterday 00:00
+    now = pd.Timestamp.now(tz="UTC")
+    first_start = (pd.Timestamp.now(tz="Europe/Amsterdam").normalize() - timedelta(days=1)).tz_convert("UTC")
+    pending = []
+    for row in selected:
+        ring = _buffers.get((row.name, row["Grootheid.Code"]))
+        if ring is None or ring.last is None:
+            start = first_start
+        else:
+            start = max(pd.Timestamp(ring.last + 1, unit="s", tz="UTC"), now - timedelta(seconds=len(ring)*ring.resolution))
+        if start < now:
+            pending.append((row, start))
+
+    # provide a single row of the locations dataframe to ddlpy.measurements, one series per worker
+    loop = asyncio.get_running_loop()
+    fetched = await asyncio.gather(*[
+        loop.run_in_executor(MEASUREMENT_POOL, METRICS.timed("http_fetch", ddlpy.measurements, model="rws",
+                                                             role=row["Grootheid.Code"]), row, start, now)
+        for row, start in pending
+    ])
+
+    for (row, start), measurements in zip(pending, fetched):
         if not measurements.empty:
-            if index not in data:
-                data[index] = {
-                    'name': row["Naam"],
-                    'lon': row["Lon"],
-                    'lat': row["Lat"]}
-            data[index][row["Grootheid.Code"]] = measurements[["Meetwaarde.Waarde_Numeriek"]]
-
-    st.session_state.measurements = data
+            _stations[row.name] = {
+                'name': row["Naam"],
+                'lon': row["Lon"],
+                'lat': row["Lat"]}
+            ring = _buffers.setdefault((row.name, row["Grootheid.Code"]), MeasurementRing())
+            ring.append(measurements.index.as_unit("s").asi8, measurements[VALUE_COLUMN].to_numpy())
+
+    return buffer_snapshot()
 
 '''
 locations = ddlpy.locations()
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import types
+
+from lru import LruCache
+
+# Upstream APIs, override them to run against benchmarks/replay_server.py or another stand-in
+OPENMETEO_URL = os.environ.get("SOAR_OPENMETEO_URL", "https://api.open-meteo.com/v1/forecast")
+RWS_URL = os.environ.get("SOAR_RWS_URL", "https://ddapi20-waterwebservices.rijkswaterstaat.nl")
+
+class CachedWeatherClient:
+    """Open-Meteo client with an in-memory LRU tier in front of the SQLite HTTP cache.
+
+    Requests are normalized on their sorted, de-duplicated coordinate pairs, so the same set of
+    locations in any order shares one cache entry. Responses come back in the caller's order.
+    """
+
+    def __init__(self, session, maxsize=64, ttl=3600):
+        import openmeteo_requests
+        self.client = openmeteo_requests.Client(session=session)
+        self.cache = LruCache(maxsize=maxsize, ttl=ttl, name="openmeteo")
+
+    def weather_api(self, url, params):
+        pairs = list(zip(as_list(params["latitude"]), as_list(params["longitude"])))
+        unique = sorted(set(pairs))
+        canonical = dict(params, latitude=[lat for lat, lon in unique], longitude=[lon for lat, lon in unique])
+        key = (url, json.dumps(canonical, sort_keys=True, default=str))
+
+        responses = self.cache.get(key)
+        if responses is None:
+            responses = self.client.weather_api(url, params=canonical)
+            self.cache.put(key, responses)
+
+        position = {pair: i for i, pair in enumerate(unique)}
+        return [responses[position[pair]] for pair in pairs]
+
+def as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+_lock = threading.Lock()
+_openmeteo = None
+_rws = None
+
+# The HTTP libraries and ddlpy are imported by the first request, not by the page importing this module
+
+def openmeteo_client():
+    """Process-wide Open-Meteo client, its keep-alive connections and caches live as long as the process"""
+    global _openmeteo
+    with _lock:
+        if _openmeteo is None:
+            import requests_cache
+            from retry_requests import retry
+            cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
+            retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
+            _openmeteo = CachedWeatherClient(retry_session)
+        return _openmeteo
+
+def rws_session():
+    """Process-wide pooled session that ddlpy posts its RWS requests through"""
+    global _rws
+    with _lock:
+        if _rws is None:
+            import ddlpy.ddlpy
+            import requests
+            from requests.adapters import HTTPAdapter
+            _rws = requests.Session()
+            _rws.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+            # ddlpy calls requests.post directly, route it through the pooled session instead
+            ddlpy.ddlpy.requests = types.SimpleNamespace(post=_rws.post)
+            for endpoint in ddlpy.ddlpy.ENDPOINTS.values():
+                path = endpoint["url"].split("/", 3)[3]
+                endpoint["url"] = f"{RWS_URL.rstrip('/')}/{path}"
+        return _rws
@@ -0,0 +1,52 @@
+import threading
+
+from collections import OrderedDict
+from time import monotonic
+
+# Named caches by name, their hit and miss counts are exported by metrics.py
+CACHES = {}
+
+class LruCache:
+    """Thread-safe in-memory LRU map with an optional time to live per entry"""
+
+    def __init__(self, maxsize=128, ttl=None, name=None):
+        if name is not None:
+            CACHES[name] = self
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl is not None and monotonic() - entry[0] > self.ttl):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize):
+        """Change maxsize, evicting the least recently used entries when it shrinks"""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -1,72 +1,147 @@
 import streamlit as st
-from streamlit_folium import st_folium
 import folium
 from folium.plugins import Draw, MeasureControl
+from folium.utilities import JsCode
 import numpy as np
-from datetime import datetime
-import openmeteo_requests
-import pandas as pd
-import requests_cache
-from retry_requests import retry
-import plotly.graph_objects as go
-from scipy.spatial.transform import Rotation as R
-
-def create_soar_map_forecast(date_idx, model='soar_knmi'):
-    """Create a complete map with forecast data for the given date"""
+import json
+
+from lru import LruCache
+from metrics import METRICS
+from point_index import PointIndex
+
+# Wind pizza GeoJSON per model, day, snapshot, scored time range and snapped viewport
+MAP_CACHE = LruCache(maxsize=64, name="maps")
+POINT_INDEX_CACHE = LruCache(maxsize=8, name="point_index")
+
+# Above this many points in view the map shows the best spot per cluster cell instead of every spot
+MAX_MAP_POINTS = 200
+MAP_CENTER = [52.038516, 4.388762]
+ZOOM_START = 8
+
+def soar_base_map():
+    """Tiles and controls only, the wind pizzas come in through st_folium's feature_group_to_add"""
     m = folium.Map(
-        location=[52.038516, 4.388762],
-        zoom_start=8,
+        location=MAP_CENTER,
+        zoom_start=ZOOM_START,
         tiles="OpenStreetMap",
         attr="OpenStreetMap"
     )
     MeasureControl().add_to(m)
+    return m
 
-    display_forecast = st.session_state.disp_forecast[model][date_idx]
-    for point_idx, pf in enumerate(display_forecast):
-        point = st.session_state.soar_points[point_idx]
-        lat, lon = point['lat'], point['lon']
-        wind_pizza = pf["wind_pizza"]
-        head = np.deg2rad(point['heading'])
-        rel_headings = [point['head_range'][0], -22.5, 22.5, point['head_range'][1]]
-        for i, slice in enumerate(wind_pizza):
-            min_x = lon + 1.63*0.04*np.min([slice, 3]) * np.sin(head+np.deg2rad(rel_headings[i]))
-            min_y = lat + 0.04*np.min([slice, 3]) * np.cos(head+np.deg2rad(rel_headings[i]))
-            max_x = lon + 1.63*0.04*np.min([slice, 3]) * np.sin(head+np.deg2rad(rel_headings[i+1]))
-            max_y = lat + 0.04*np.min([slice, 3]) * np.cos(head+np.deg2rad(rel_headings[i+1]))
-
-            if i == 1:
-                color = "green"
-            else:
-                color = "orange"
-
-            folium.Polygon(
-                locations=[[lat, lon], [min_y, min_x], [max_y, max_x]],
-                color=color,
-                weight=2,
-                fill=True,
-                fill_color=color,
-                fill_opacity=0.5,
-            ).add_to(m)
+def point_index(points, points_key):
+    index = POINT_INDEX_CACHE.get(points_key)
+    if index is None:
+        index = PointIndex.of_points(points)
+        POINT_INDEX_CACHE.put(points_key, index)
+    return index
 
-        # Add center marker with different colors for types
-        if pf['good_hours'] >= 3:
-            marker_color = "green"
-        elif pf['good_hours'] + pf['cross_hours'] > 0:
-            marker_color = "orange"
-        else:
-            marker_color = "red"
+def viewport(view):
+    """(south, west, north, east, zoom) from the last st_folium state, None before the map reported one"""
+    bounds = (view or {}).get("bounds") or {}
+    south_west, north_east = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    corners = [south_west.get("lat"), south_west.get("lng"), north_east.get("lat"), north_east.get("lng")]
+    if None in corners or view.get("zoom") is None or corners[0] >= corners[2] or corners[1] >= corners[3]:
+        return None
+    return (*corners, int(view["zoom"]))
 
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=5,
-            color=marker_color,
-            fill=True,
-            fill_color=marker_color,
-            fill_opacity=1,
-            popup=f"{point['name']} \n {point['lat']}N°, {point['lon']}E°"
-        ).add_to(m)
+def visible_points(index, display_forecast, view):
+    """Positions of the points to draw and the size of the cluster each stands for.
 
-    return m
+    Every point is drawn while there are at most MAX_MAP_POINTS. Beyond that only the points inside the
+    viewport, padded by half its size so small pans keep the same layer, and at most one per cluster cell.
+    """
+    everything = np.arange(len(index))
+    if len(index) <= MAX_MAP_POINTS:
+        return everything, np.ones(len(index), dtype=int)
+    score = np.array([pf["good_hours"] + pf["cross_hours"]/2 for pf in display_forecast], dtype=float)
+    if view is None:
+        return index.clusters(everything, ZOOM_START, score)
+    south, west, north, east, zoom = view
+    pad_lat, pad_lon = (north - south)/2, (east - west)/2
+    inside = index.within(south - pad_lat, west - pad_lon, north + pad_lat, east + pad_lon)
+    if len(inside) <= MAX_MAP_POINTS:
+        return inside, np.ones(len(inside), dtype=int)
+    return index.clusters(inside, zoom, score)
+
+def soar_map_layer(date_idx, model='soar_knmi', view=None):
+    """Wind pizza layer of the points in view, to be passed to st_folium as feature_group_to_add"""
+    points = st.session_state.soar_points
+    points_key = json.dumps(points, sort_keys=True)
+    index = point_index(points, points_key)
+    view = viewport(view)
+    if len(index) <= MAX_MAP_POINTS:
+        view = None
+    elif view is not None:
+        # Snap the view to half-viewport steps, the layer only changes once the padding is used up
+        south, west, north, east, zoom = view
+        step_lat, step_lon = (north - south)/2, (east - west)/2
+        view = (np.floor(south/step_lat)*step_lat, np.floor(west/step_lon)*step_lon,
+                np.ceil(north/step_lat)*step_lat, np.ceil(east/step_lon)*step_lon, zoom)
+
+    key = (model, date_idx, st.session_state.forecast_version, st.session_state.disp_time_range,
+           points_key, view)
+    geojson = MAP_CACHE.get(key)
+    if geojson is None:
+        with METRICS.span("map_build"):
+            display_forecast = st.session_state.disp_forecast[model][date_idx]
+            shown, counts = visible_points(index, display_forecast, view)
+            geojson = wind_pizza_geojson([points[p] for p in shown], [display_forecast[p] for p in shown], counts)
+        MAP_CACHE.put(key, geojson)
+
+    layer = folium.FeatureGroup(name="Wind pizzas")
+    if geojson["features"]:
+        wind_pizza_layer(geojson).add_to(layer)
+    return layer
+
+PIZZA_COLORS = ["orange", "green", "orange"]
+
+def wind_pizza_geojson(points, display_forecast, counts=None):
+    """All wind pizza slices and center markers of one day as a single GeoJSON FeatureCollection"""
+    if not points:
+        return {"type": "FeatureCollection", "features": []}
+    lat = np.array([point['lat'] for point in points], dtype=float)
+    lon = np.array([point['lon'] for point in points], dtype=float)
+    head = np.deg2rad([point['heading'] for point in points])[:, None]
+    edges = np.deg2rad([[point['head_range'][0], -22.5, 22.5, point['head_range'][1]] for point in points])
+    pizza = np.array([pf["wind_pizza"] for pf in display_forecast], dtype=float).reshape(len(points), 3)
+    good = np.array([pf["good_hours"] for pf in display_forecast], dtype=float)
+    cross = np.array([pf["cross_hours"] for pf in display_forecast], dtype=float)
+
+    # Slice i spans edges i..i+1, its radius grows with the hours of that class up to 3
+    radius = 0.04*np.minimum(pizza, 3)
+    min_x = lon[:, None] + 1.63*radius*np.sin(head + edges[:, :3])
+    min_y = lat[:, None] + radius*np.cos(head + edges[:, :3])
+    max_x = lon[:, None] + 1.63*radius*np.sin(head + edges[:, 1:])
+    max_y = lat[:, None] + radius*np.cos(head + edges[:, 1:])
+
+    features = []
+    for p, i in zip(*np.nonzero(radius)):
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [[[lon[p], lat[p]], [min_x[p, i], min_y[p, i]],
+                                                              [max_x[p, i], max_y[p, i]], [lon[p], lat[p]]]]},
+            "properties": {"style": {"color": PIZZA_COLORS[i], "weight": 2, "fillColor": PIZZA_COLORS[i], "fillOpacity": 0.5}}
+        })
+
+    marker_color = np.where(good >= 3, "green", np.where(good + cross > 0, "orange", "red"))
+    for p, point in enumerate(points):
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon[p], lat[p]]},
+            "properties": {"style": {"color": marker_color[p], "fillColor": marker_color[p], "fillOpacity": 1},
+                           "popup": f"{point['name']} \n {point['lat']}N°, {point['lon']}E°"
+                                    + ("" if counts is None or counts[p] == 1 else f" \n best of {counts[p]} spots")}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def wind_pizza_layer(geojson):
+    return folium.GeoJson(
+        geojson,
+        style_function=lambda feature: feature["properties"]["style"],
+        marker=folium.CircleMarker(radius=5, fill=True),
+        on_each_feature=JsCode("function(feature, layer) { if (feature.properties.popup) { layer.bindPopup(feature.properties.popup); } }")
+    )
 
 def create_therm_map_forecast(date_index):
     """Create a complete map with forecast data for the given date"""
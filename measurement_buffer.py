@@ -0,0 +1,71 @@
+import numpy as np
+
+VALUE_COLUMN = "Meetwaarde.Waarde_Numeriek"
+
+class MeasurementRing:
+    """Fixed-size, time-indexed ring buffer of one measured series (48 h at 10 minute resolution by default).
+
+    Every sample lands in the slot of its resolution step, so memory stays bounded however long the
+    process runs and re-ingesting an overlapping period overwrites instead of duplicating.
+    """
+    __slots__ = ("resolution", "times", "values", "last")
+
+    def __init__(self, hours=48, resolution=600):
+        self.resolution = resolution
+        self.times = np.full(hours*3600 // resolution, -1, dtype=np.int64)
+        self.values = np.full(hours*3600 // resolution, np.nan, dtype=np.float32)
+        self.last = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, times, values):
+        """Store samples given as UTC epoch seconds, older than the buffer window they are dropped"""
+        times = np.asarray(times, dtype=np.int64) // self.resolution * self.resolution
+        values = np.asarray(values, dtype=np.float32)
+        if len(times) == 0:
+            return
+        last = max(times.max(), self.last if self.last is not None else times.max())
+        keep = times > last - len(self)*self.resolution
+        slots = (times[keep] // self.resolution) % len(self)
+        self.times[slots] = times[keep]
+        self.values[slots] = values[keep]
+        self.last = int(last)
+
+    def series(self):
+        """Chronological (UTC epoch seconds, values) of everything still inside the window"""
+        if self.last is None:
+            return self.times[:0], self.values[:0]
+        start = (self.last // self.resolution + 1) % len(self)
+        times = np.roll(self.times, -start)
+        values = np.roll(self.values, -start)
+        valid = times > self.last - len(self)*self.resolution
+        return times[valid], values[valid]
+
+    def copy(self):
+        ring = MeasurementRing.__new__(MeasurementRing)
+        ring.resolution = self.resolution
+        ring.times = self.times.copy()
+        ring.values = self.values.copy()
+        ring.last = self.last
+        return ring
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling to threshold points, keeps peaks and the end points"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    xf = x.view(np.int64).astype(np.float64) if x.dtype.kind == "M" else x.astype(np.float64)
+    yf = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    keep = np.zeros(threshold, dtype=np.intp)
+    keep[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xf[stop:next_stop].mean(), yf[stop:next_stop].mean()
+        area = np.abs((xf[a] - avg_x)*(yf[start:stop] - yf[a]) - (xf[a] - xf[start:stop])*(avg_y - yf[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
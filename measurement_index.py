@@ -0,0 +1,80 @@
+import numpy as np
+
+HOUR = 3600
+KMH = 3.6
+
+class StationIndex:
+    """Sorted samples of one station and their hourly aggregates on the forecast's UTC hour axis.
+
+    Built once per measurement refresh, day windows are then searchsorted slices. Hourly values use
+    the forecast variable names and units: mean wind_speed and max wind_gusts in km/h (gusts fall back
+    to the 10 minute means when the station has no WINDST) and circular-mean wind_direction in degrees.
+    """
+    __slots__ = ("samples", "time", "hourly")
+
+    def __init__(self, rings):
+        self.samples = {quantity: ring.series() for quantity, ring in rings.items()}
+
+        filled = [times for times, values in self.samples.values() if len(times)]
+        if filled:
+            hours = np.arange(min(t[0] for t in filled) // HOUR, max(t[-1] for t in filled) // HOUR + 1) * HOUR
+        else:
+            hours = np.zeros(0, dtype=np.int64)
+        # Nanoseconds, the same axis as ForecastStore.time
+        self.time = hours * 1_000_000_000
+
+        self.hourly = {}
+        speed = self.samples.get("WINDSHD")
+        if speed is not None:
+            self.hourly["wind_speed"] = hourly_mean(hours, *speed) * KMH
+            self.hourly["wind_gusts"] = hourly_max(hours, *self.samples.get("WINDST", speed)) * KMH
+        if "WINDRTG" in self.samples:
+            self.hourly["wind_direction"] = hourly_circular_mean(hours, *self.samples["WINDRTG"])
+
+    def window(self, quantity, before=None, after=None):
+        """(datetime64[s] UTC times, values) of one quantity inside [before, after], views on the index"""
+        times, values = self.samples[quantity]
+        start, stop = search(times, before, after)
+        return times[start:stop].view("datetime64[s]"), values[start:stop]
+
+    def hourly_window(self, before=None, after=None):
+        """Hourly aggregates inside [before, after] keyed like the forecast, plus their 'time'"""
+        start, stop = search(self.time // 1_000_000_000, before, after)
+        window = {name: values[start:stop] for name, values in self.hourly.items()}
+        window["time"] = self.time[start:stop].view("datetime64[ns]")
+        return window
+
+def search(times, before, after):
+    start = 0 if before is None else np.searchsorted(times, int(before.timestamp()), side="left")
+    stop = len(times) if after is None else np.searchsorted(times, int(after.timestamp()), side="right")
+    return start, stop
+
+def hour_buckets(hours, times, values):
+    valid = np.isfinite(values)
+    first = hours[0] if len(hours) else 0
+    return (times[valid] - first) // HOUR, values[valid].astype(np.float64)
+
+def hourly_mean(hours, times, values):
+    idx, values = hour_buckets(hours, times, values)
+    count = np.bincount(idx, minlength=len(hours))
+    total = np.bincount(idx, weights=values, minlength=len(hours))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (total / count).astype(np.float32)
+
+def hourly_max(hours, times, values):
+    idx, values = hour_buckets(hours, times, values)
+    out = np.full(len(hours), np.nan)
+    np.fmax.at(out, idx, values)
+    return out.astype(np.float32)
+
+def hourly_circular_mean(hours, times, values):
+    # Mean of the unit vectors, so 350° and 10° average to 0° instead of 180°
+    idx, values = hour_buckets(hours, times, values)
+    radians = np.deg2rad(values)
+    count = np.bincount(idx, minlength=len(hours))
+    sin = np.bincount(idx, weights=np.sin(radians), minlength=len(hours))
+    cos = np.bincount(idx, weights=np.cos(radians), minlength=len(hours))
+    # Rounded first so a mean of -0.000001° does not end up as 360°
+    direction = np.round(np.rad2deg(np.arctan2(sin, cos)), 3) % 360
+    direction[count == 0] = np.nan
+    return direction.astype(np.float32)
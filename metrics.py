@@ -0,0 +1,132 @@
+import os
+import threading
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import lru
+
+# Exporters are off unless configured, the in-process registry is always there for the admin panel
+METRICS_FILE = os.environ.get("SOAR_METRICS_FILE")
+METRICS_PORT = os.environ.get("SOAR_METRICS_PORT")
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Metrics:
+    """Thread-safe registry of stage timings, counters and gauges, exported in Prometheus text format.
+
+    Stage spans are aggregated per (stage, labels) into count, total and max seconds. Gauges are
+    callbacks read at export time, LruCache hit/miss counters are picked up from lru.CACHES.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+
+    @contextmanager
+    def span(self, stage, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - start, **labels)
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, longest = self.spans.get(key, (0, 0.0, 0.0))
+            self.spans[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    def timed(self, stage, function, **labels):
+        """function wrapped in a span, for callables handed to executors"""
+        def wrapper(*args, **kwargs):
+            with self.span(stage, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, read, **labels):
+        """Register read() as the current value of a gauge, None values are left out of the export"""
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def rows(self):
+        """(stage, labels, count, total, max) of every span, for display"""
+        with self._lock:
+            return [(stage, dict(labels), count, total, longest)
+                    for (stage, labels), (count, total, longest) in sorted(self.spans.items())]
+
+    def prometheus(self):
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items(), key=lambda item: item[0])
+
+        lines = ["# TYPE soar_stage_seconds summary"]
+        for (stage, labels), (count, total, longest) in spans:
+            text = label_text((("stage", stage),) + labels)
+            lines += [f"soar_stage_seconds_count{text} {count}", f"soar_stage_seconds_sum{text} {total:.6f}"]
+        lines.append("# TYPE soar_stage_seconds_max gauge")
+        for (stage, labels), (count, total, longest) in spans:
+            lines.append(f"soar_stage_seconds_max{label_text((('stage', stage),) + labels)} {longest:.6f}")
+
+        for name in sorted(set(name for (name, labels), value in counters)):
+            lines.append(f"# TYPE soar_{name}_total counter")
+            lines += [f"soar_{name}_total{label_text(labels)} {value}" for (other, labels), value in counters if other == name]
+
+        for metric, attribute in [("cache_hits_total", "hits"), ("cache_misses_total", "misses"), ("cache_entries", None)]:
+            lines.append(f"# TYPE soar_{metric} {'gauge' if attribute is None else 'counter'}")
+            for name, cache in sorted(lru.CACHES.items()):
+                value = len(cache) if attribute is None else getattr(cache, attribute)
+                lines.append(f"soar_{metric}{label_text((('cache', name),))} {value}")
+
+        for name in sorted(set(name for (name, labels), read in gauges)):
+            lines.append(f"# TYPE soar_{name} gauge")
+            for (other, labels), read in gauges:
+                value = read() if other == name else None
+                if value is not None:
+                    lines.append(f"soar_{name}{label_text(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Written next to the target and renamed, so a node exporter never reads half a file
+        with open(path + ".tmp", "w") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose /metrics on a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus().encode()
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, int(port)), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+    def export(self):
+        if METRICS_FILE:
+            self.write(METRICS_FILE)
+
+METRICS = Metrics()
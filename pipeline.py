@@ -0,0 +1,180 @@
+"""Fetch → process → score pipeline without Streamlit.
+
+The app's snapshot providers call refresh_forecast and refresh_measurements, batch jobs call run() or
+this module as a script. Either way forecast.cache and measurements.pkl are written, and the app picks
+newer files up instead of fetching itself.
+
+    $ python pipeline.py [--points soar_points.json] [--no-measurements] [--start 00:00 --end 23:59]
+"""
+import argparse
+import asyncio
+import hashlib
+import pickle
+import traceback
+
+from collections import namedtuple
+from datetime import datetime, time
+from json import load, dumps
+from os import remove, path
+from types import MappingProxyType
+
+from forecast_cache import FORECAST_CACHE, LEGACY_FORECAST, atomic_write, load_forecast_cache, save_forecast_cache, migrate_legacy_forecast
+from forecast_provider import Snapshot
+from metrics import METRICS
+from get_measured_data import get_wind_measurements, stored_snapshot, assign_stations
+from process_forecast import SOAR_VARIABLES, get_forecast_soar, process_soar_forecast, forecast_display_soar, best_spot_summary
+
+POINTS = "soar_points.json"
+MEASUREMENTS = "measurements.pkl"
+MODELS = {"soar_knmi": "knmi_seamless", "soar_ecmwf": "ecmwf_ifs"}
+DEFAULT_TIME_RANGE = (time(00, 00), time(23, 59))
+WEEK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# disp_forecast and disp_summary of the app, for one set of points and one time range
+Display = namedtuple("Display", ["forecast", "summary"])
+PipelineResult = namedtuple("PipelineResult", ["forecast", "measurements", "display"])
+
+# Files that fail to parse or carry an unknown format, anything else (I/O, memory) leaves the file in place
+UNREADABLE = (ValueError, KeyError, EOFError, pickle.UnpicklingError)
+
+def read_points(points_path=POINTS):
+    with open(points_path, "r") as f:
+        return assign_stations(load(f))
+
+def points_fingerprint(points):
+    """Hash of the coordinates and stations a snapshot was fetched for, stored with it"""
+    keys = ["lat", "lon", "offshore_lat", "offshore_lon", "station"]
+    return hashlib.sha1(dumps([[point.get(key) for key in keys] for point in points]).encode()).hexdigest()
+
+def expected_fingerprint(points):
+    """Fingerprint a stored snapshot must carry for points, and the one to assume for unstamped files.
+
+    Snapshots written before fingerprints were stored were always fetched for soar_points.json.
+    """
+    default = points_fingerprint(read_points())
+    return default if points is None else points_fingerprint(points), default
+
+def day_labels(today=None):
+    """Labels of the forecast days, yesterday up to six days ahead"""
+    week_day = (today or datetime.today()).weekday()
+    return ["Yesterday", "Today", "Tomorrow"] + [WEEK_DAYS[(week_day + offset) % 7] for offset in range(2, 7)]
+
+def load_forecast(points=None):
+    """The stored forecast if it was fetched for points (soar_points.json by default), else None"""
+    if not path.isfile(FORECAST_CACHE) and not path.isfile(LEGACY_FORECAST):
+        return None
+    try:
+        expected, default = expected_fingerprint(points)
+        if not path.isfile(FORECAST_CACHE):
+            migrate_legacy_forecast(SOAR_VARIABLES, points=default)
+        with METRICS.span("cache_load", snapshot="forecast"):
+            forecast = load_forecast_cache(SOAR_VARIABLES, points=default)
+        if forecast["points"] != expected:
+            # Written for another point set, e.g. pipeline.py --points, rows would not match these spots
+            return None
+        if all(model in forecast for model in MODELS):
+            return MappingProxyType(forecast)
+    except UNREADABLE:
+        traceback.print_exc()
+    except Exception:
+        traceback.print_exc()
+        return None
+    try:
+        remove(FORECAST_CACHE if path.isfile(FORECAST_CACHE) else LEGACY_FORECAST)
+    except:
+        pass
+    return None
+
+def load_measurements(points=None):
+    """The stored measurements if they were fetched for points (soar_points.json by default), else None"""
+    if not path.isfile(MEASUREMENTS):
+        return None
+    try:
+        expected, default = expected_fingerprint(points)
+        with METRICS.span("cache_load", snapshot="measurements"):
+            with open(MEASUREMENTS, "rb") as f:
+                measurements = pickle.load(f)
+            if measurements.get('points', default) != expected:
+                return None
+            data = stored_snapshot(measurements)
+        data['time'] = measurements['time']
+        data['points'] = measurements.get('points', default)
+        return MappingProxyType(data)
+    except UNREADABLE:
+        traceback.print_exc()
+    except Exception:
+        traceback.print_exc()
+        return None
+    try:
+        remove(MEASUREMENTS)
+    except:
+        pass
+    return None
+
+async def make_forecast(points):
+    print("Getting forecasts")
+    fetching = {name: asyncio.create_task(get_forecast_soar(points, model=model)) for name, model in MODELS.items()}
+    raw_forecast = {name: await task for name, task in fetching.items()}
+
+    forecast = await process_soar_forecast(raw_forecast)
+
+    forecast['time'] = datetime.now()
+    forecast['points'] = points_fingerprint(points)
+    with METRICS.span("cache_save", snapshot="forecast"):
+        save_forecast_cache(forecast)
+    return MappingProxyType(forecast)
+
+def refresh_forecast(points=None):
+    return asyncio.run(make_forecast(read_points() if points is None else points))
+
+async def make_measurements(points):
+    measurements = await get_wind_measurements(points)
+
+    measurements['time'] = datetime.now()
+    measurements['points'] = points_fingerprint(points)
+
+    # Through a temp file, an app loading measurements.pkl meanwhile must not see (and discard) half a pickle
+    with METRICS.span("cache_save", snapshot="measurements"), atomic_write(MEASUREMENTS) as f:
+        pickle.dump(measurements, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return MappingProxyType(measurements)
+
+def refresh_measurements(points=None):
+    return asyncio.run(make_measurements(read_points() if points is None else points))
+
+def display_forecast(forecast, points, time_range=DEFAULT_TIME_RANGE, labels=None):
+    """Score a forecast snapshot for the given points and time range"""
+    disp_forecast = forecast_display_soar({model: forecast[model] for model in MODELS}, points, time_range)
+    return Display(disp_forecast, best_spot_summary(disp_forecast, points, labels or day_labels()))
+
+def run(points=None, time_range=DEFAULT_TIME_RANGE, measurements=True):
+    """One full refresh: fetch and process both models, optionally measurements, and score the result"""
+    points = read_points() if points is None else points
+    forecast = refresh_forecast(points)
+    measured = refresh_measurements(points) if measurements else None
+    return PipelineResult(
+        Snapshot(forecast, forecast['time'], 0),
+        None if measured is None else Snapshot(measured, measured['time'], 0),
+        display_forecast(forecast, points, time_range)
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch, process and score the soar forecast and write its snapshots")
+    parser.add_argument("--points", default=POINTS, help="JSON list of soar points")
+    parser.add_argument("--no-measurements", action="store_true", help="skip the RWS measurements")
+    parser.add_argument("--start", default="00:00", type=time.fromisoformat, help="start of the scored time range")
+    parser.add_argument("--end", default="23:59", type=time.fromisoformat, help="end of the scored time range")
+    args = parser.parse_args(argv)
+
+    points = read_points(args.points)
+    result = run(points, (args.start, args.end), measurements=not args.no_measurements)
+    METRICS.export()
+
+    labels = day_labels()
+    for model, summary in result.display.summary.items():
+        print(model)
+        for day, best in enumerate(summary["best"]):
+            print(f"  {labels[day]:<10} {points[best]['name']:<30} "
+                  f"{summary['good_hours'][day]:>4.0f} good {summary['cross_hours'][day]:>4.0f} cross")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+# Screen size of a cluster cell in pixels at the current zoom, one 256 px tile spans 360° / 2**zoom
+CLUSTER_PX = 48
+
+def planar(lat, lon):
+    # Longitude shrinks with cos(lat), close enough to metric for nearest-neighbour queries over the Netherlands
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return np.column_stack([lat, lon*np.cos(np.deg2rad(lat))])
+
+class PointIndex:
+    """Spatial index over a list of coordinates.
+
+    nearest() is a cKDTree query, within() a searchsorted range on the longitude-sorted points
+    followed by a latitude mask, so neither walks the full list.
+    """
+    __slots__ = ("lat", "lon", "order", "sorted_lon", "tree")
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.order = np.argsort(self.lon, kind="stable")
+        self.sorted_lon = self.lon[self.order]
+        # scipy.spatial is imported by the first index, pages that never build one skip it
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(planar(self.lat, self.lon))
+
+    @classmethod
+    def of_points(cls, points, lat="lat", lon="lon"):
+        return cls([point[lat] for point in points], [point[lon] for point in points])
+
+    def __len__(self):
+        return len(self.lat)
+
+    def nearest(self, lat, lon):
+        """Position of the nearest indexed coordinate for every (lat, lon) given"""
+        _, idx = self.tree.query(planar(np.atleast_1d(lat), np.atleast_1d(lon)))
+        return idx
+
+    def within(self, south, west, north, east):
+        """Sorted positions of the coordinates inside the box"""
+        start = np.searchsorted(self.sorted_lon, west, side="left")
+        stop = np.searchsorted(self.sorted_lon, east, side="right")
+        candidates = self.order[start:stop]
+        lat = self.lat[candidates]
+        return np.sort(candidates[(south <= lat) & (lat <= north)])
+
+    def clusters(self, positions, zoom, score):
+        """One representative per CLUSTER_PX grid cell, the position with the highest score, and the cell counts"""
+        cell = CLUSTER_PX/256*360/2**zoom
+        rows = np.floor(self.lat[positions]/cell).astype(np.int64)
+        cols = np.floor(self.lon[positions]/cell).astype(np.int64)
+        _, cell_id = np.unique(np.column_stack([rows, cols]), axis=0, return_inverse=True)
+        cell_id = cell_id.ravel()
+        # Sorted by cell, best score first inside a cell, so the first entry of every cell is its representative
+        order = np.lexsort((-np.asarray(score)[positions], cell_id))
+        _, first, counts = np.unique(cell_id[order], return_index=True, return_counts=True)
+        return positions[order[first]], counts
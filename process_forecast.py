@@ -1,314 +1,250 @@
-import streamlit as st
+import asyncio
 import numpy as np
-import openmeteo_requests
 import pandas as pd
-import requests_cache
-from retry_requests import retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
+from forecast_store import build_forecast_store
+from lru import LruCache
+from metrics import METRICS
+from forecast_fetch import SOAR_SPEC, THERM_SPEC, fetch_forecast
 from get_measured_data import get_wind_measurements
 
-async def get_forecast_soar(model = "knmi_seamless"):
-    forecast = []
-    url = "https://api.open-meteo.com/v1/forecast"
-
-    params = {
-        "latitude": [point["lat"] for point in st.session_state.soar_points],
-        "longitude": [point["lon"] for point in st.session_state.soar_points],
-        "daily": ["sunrise", "sunset"],
-        "hourly": ["temperature_2m", "visibility", "precipitation"],
-        "models": model,
-        "timezone": "Europe/Berlin",
-        "past_days": 1,
-        "forecast_days": 7,
-    }
-
-    offshore_params = {
-        "latitude": [point["offshore_lat"] for point in st.session_state.soar_points],
-        "longitude": [point["offshore_lon"] for point in st.session_state.soar_points],
-        "hourly": ["wind_speed_10m", "wind_direction_10m", "wind_gusts_10m"],
-        "models": model,
-        "timezone": "Europe/Berlin",
-        "past_days": 1,
-        "forecast_days": 7,
-    }
-
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
-
-    responses = openmeteo.weather_api(url, params=params)
-    offshore_responses = openmeteo.weather_api(url, params=offshore_params)
-
-    for id, response in enumerate(responses):
-        hourly = response.Hourly()
-        offshore_hourly = offshore_responses[id].Hourly()
-
-        hourly_data = {
-            "date": pd.date_range(
-                start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-                end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-                freq=pd.Timedelta(seconds=hourly.Interval()),
-                inclusive="left"
-            ),
-            "temperature": hourly.Variables(0).ValuesAsNumpy(),
-            "visibility": hourly.Variables(1).ValuesAsNumpy(),
-            "wind_speed": offshore_hourly.Variables(0).ValuesAsNumpy(),
-            "wind_direction": offshore_hourly.Variables(1).ValuesAsNumpy(),
-            "wind_gusts": offshore_hourly.Variables(2).ValuesAsNumpy(),
-            "precipitation": hourly.Variables(2).ValuesAsNumpy()
-        }
-
-        daily = response.Daily()
-        daily_data = {
-            "date": pd.date_range(
-                start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-                end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-                freq=pd.Timedelta(seconds=daily.Interval()),
-                inclusive="left"
-            ),
-            "sunrise": pd.to_datetime(daily.Variables(0).ValuesInt64AsNumpy(), unit="s", utc=True),
-            "sunset": pd.to_datetime(daily.Variables(1).ValuesInt64AsNumpy(), unit="s", utc=True)
-        }
+# openmeteo_requests is blocking, requests for both models run side by side here
+FETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="openmeteo")
 
-        forecast.append({"id": id, "daily_data": daily_data, "hourly_data": hourly_data})
-    if model == "knmi_seamless":
-        st.session_state.raw_forecast['soar_knmi'] = forecast
-    else:
-        st.session_state.raw_forecast['soar_ecmwf'] = forecast
-
-async def get_forecast_therm():
-    forecast = []
-    url = "https://api.open-meteo.com/v1/forecast"
-
-    params = {
-        "latitude": [point["lat"] for point in st.session_state.therm_points],
-        "longitude": [point["lon"] for point in st.session_state.therm_points],
-        "daily": ["sunrise", "sunset"],
-        "hourly": ["temperature_2m", "visibility", "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m", "precipitation", "temperature_1000hPa", "temperature_925hPa", "temperature_850hPa", "temperature_700hPa", "direct_radiation"],
-        "models": "ecmwf_ifs",
-        "timezone": "Europe/Berlin",
-        "past_days": 1,
-        "forecast_days": 7,
-    }
-
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
-
-    responses = openmeteo.weather_api(url, params=params)
-
-    for id, response in enumerate(responses):
-        hourly = response.Hourly()
-        hourly_data = {
-            "date": pd.date_range(
-                start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-                end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-                freq=pd.Timedelta(seconds=hourly.Interval()),
-                inclusive="left"
-            ),
-            "temperature": hourly.Variables(0).ValuesAsNumpy(),
-            "visibility": hourly.Variables(1).ValuesAsNumpy(),
-            "wind_speed": hourly.Variables(2).ValuesAsNumpy(),
-            "wind_direction": hourly.Variables(3).ValuesAsNumpy(),
-            "wind_gusts": hourly.Variables(4).ValuesAsNumpy(),
-            "precipitation": hourly.Variables(5).ValuesAsNumpy(),
-            "temperature_110m": hourly.Variables(6).ValuesAsNumpy(),
-            "temperature_800m": hourly.Variables(7).ValuesAsNumpy(),
-            "temperature_1500m": hourly.Variables(8).ValuesAsNumpy(),
-            "temperature_3000m": hourly.Variables(9).ValuesAsNumpy(),
-            "solar_irradiation": hourly.Variables(10).ValuesAsNumpy()
-        }
-
-        daily = response.Daily()
-        daily_data = {
-            "date": pd.date_range(
-                start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-                end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-                freq=pd.Timedelta(seconds=daily.Interval()),
-                inclusive="left"
-            ),
-            "sunrise": pd.to_datetime(daily.Variables(0).ValuesInt64AsNumpy(), unit="s", utc=True),
-            "sunset": pd.to_datetime(daily.Variables(1).ValuesInt64AsNumpy(), unit="s", utc=True)
-        }
+async def get_forecast_soar(points, model = "knmi_seamless"):
+    # Onshore and offshore coordinates go out as one request, see SOAR_SPEC for what is fetched where
+    forecast, = await fetch_jobs(model, [(points, SOAR_SPEC)])
+    return forecast
 
-        forecast.append({"id": id, "daily_data": daily_data, "hourly_data": hourly_data})
+async def get_forecast_therm(points, model = "ecmwf_ifs"):
+    forecast, = await fetch_jobs(model, [(points, THERM_SPEC)])
     return forecast
 
-async def process_soar_forecast(model="soar_knmi"):
-    dates = list(set([date.date() for date in st.session_state.raw_forecast[model][0]["daily_data"]["date"]]))
-    dates.sort()
+async def fetch_jobs(model, jobs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(FETCH_POOL, fetch_forecast, model, jobs)
 
-    if 'date_list' not in st.session_state:
-        st.session_state.date_list = dates
-
-    forecast = []
-    for date in dates:
-        daily = [{
-            "sunrise": next(data for i, data in enumerate(point_forecast["daily_data"]["sunrise"])
-                        if point_forecast["daily_data"]["date"][i].date() == date),
-            "sunset": next(data for i, data in enumerate(point_forecast["daily_data"]["sunset"])
-                        if point_forecast["daily_data"]["date"][i].date() == date)
-        } for point_forecast in st.session_state.raw_forecast[model]]
-
-        day_forecast = [{
-            "sunrise": daily[point]["sunrise"],
-            "sunset": daily[point]["sunset"],
-            "time": [time for time in point_forecast["hourly_data"]["date"]
-                    if (time >= start_day(daily, point) and time <= end_day(daily, point))],
-            "temperature": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "precipitation": [data for i, data in enumerate(point_forecast["hourly_data"]["precipitation"])
-                            if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                                and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "visibility": [data for i, data in enumerate(point_forecast["hourly_data"]["visibility"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_speed": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_speed"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_speed_measured": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_speed"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_direction": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_direction"])
-                            if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                                and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_gusts": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_gusts"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))]
-        } for point, point_forecast in enumerate(st.session_state.raw_forecast[model])]
-        forecast.append(day_forecast)
-    
-    st.session_state.forecast[model] = forecast
-
-
-async def process_therm_forecast():
-    dates = list(set([date.date() for date in st.session_state.raw_forecast[0]["daily_data"]["date"]]))
-    dates.sort()
+SOAR_VARIABLES = [spec.name for spec in SOAR_SPEC]
+THERM_VARIABLES = [spec.name for spec in THERM_SPEC]
 
-    if 'date_list' not in st.session_state:
-        st.session_state.date_list = dates
-
-    forecast = []
-    for date in dates:
-        daily = [{
-            "sunrise": next(data for i, data in enumerate(point_forecast["daily_data"]["sunrise"])
-                        if point_forecast["daily_data"]["date"][i].date() == date),
-            "sunset": next(data for i, data in enumerate(point_forecast["daily_data"]["sunset"])
-                        if point_forecast["daily_data"]["date"][i].date() == date)
-        } for point_forecast in st.session_state.raw_forecast]
-
-        day_forecast = [{
-            "sunrise": daily[point]["sunrise"],
-            "sunset": daily[point]["sunset"],
-            "time": [time for time in point_forecast["hourly_data"]["date"]
-                    if (time >= start_day(daily, point) and time <= end_day(daily, point))],
-            "temperature": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "temperature_110m": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature_110m"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "temperature_800m": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature_800m"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "temperature_1500m": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature_1500m"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "temperature_3000m": [data for i, data in enumerate(point_forecast["hourly_data"]["temperature_3000m"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "solar_irradiation": [data for i, data in enumerate(point_forecast["hourly_data"]["solar_irradiation"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "precipitation": [data for i, data in enumerate(point_forecast["hourly_data"]["precipitation"])
-                            if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                                and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "visibility": [data for i, data in enumerate(point_forecast["hourly_data"]["visibility"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_speed": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_speed"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_direction": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_direction"])
-                            if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                                and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))],
-            "wind_gusts": [data for i, data in enumerate(point_forecast["hourly_data"]["wind_gusts"])
-                        if (point_forecast["hourly_data"]["date"][i] >= start_day(daily, point)
-                            and point_forecast["hourly_data"]["date"][i] <= end_day(daily, point))]
-        } for point, point_forecast in enumerate(st.session_state.raw_forecast)]
-        forecast.append(day_forecast)
+def forecast_dates(raw_forecast):
+    dates = list(set([date.date() for date in raw_forecast[0]["daily_data"]["date"]]))
+    dates.sort()
+    return dates
+
+def day_bounds(point_forecast, dates):
+    # One searchsorted per point on the hourly axis instead of comparing every timestamp per day
+    daily = point_forecast["daily_data"]
+    day_pos = {date.date(): i for i, date in enumerate(daily["date"])}
+    order = [day_pos[date] for date in dates]
+
+    sunrise = daily["sunrise"][order]
+    sunset = daily["sunset"][order]
+    hours = point_forecast["hourly_data"]["date"]
+
+    starts = hours.searchsorted(sunrise + timedelta(hours=-1), side="left")
+    stops = hours.searchsorted(sunset + timedelta(hours=2), side="right")
+    return sunrise, sunset, starts, stops
+
+def slice_days(raw_forecast, dates, variables):
+    # Every entry is a view on the point's hourly arrays, nothing is copied per day
+    forecast = [[] for _ in dates]
+    for point_forecast in raw_forecast:
+        hourly = point_forecast["hourly_data"]
+        sunrise, sunset, starts, stops = day_bounds(point_forecast, dates)
+        for day, (start, stop) in enumerate(zip(starts, stops)):
+            day_forecast = {
+                "sunrise": sunrise[day],
+                "sunset": sunset[day],
+                "time": hourly["date"][start:stop]
+            }
+            for variable in variables:
+                day_forecast[variable] = hourly[variable][start:stop]
+            forecast[day].append(day_forecast)
     return forecast
 
-def forecast_display_soar(forecast):
-    disp_forecast = []
-    for day_idx, day in enumerate(forecast):
-        day_forecast = []
-        for i, point_forecast in enumerate(day):
-            point = st.session_state.soar_points[i]
-            wind_pizza = np.zeros(3)
-            start = None
-            prev = None
-            gantt = []
-            last_time = None
-            for i, time in enumerate(point_forecast["time"]):
-                
-                # Check basic conditions
-                if start_window(time) < time < end_window(time) \
-                and point_forecast["precipitation"][i] < 0.01 \
-                and point_forecast["visibility"][i] > 99 \
-                and point_forecast["wind_speed"][i] > point['wind_range'][0] \
-                and point_forecast["wind_gusts"][i] < point['wind_range'][1]:
-                    rel_head = point_forecast["wind_direction"][i] - point["heading"]
-                    if point['head_range'][0] < rel_head < -22.5:
-                        if prev != 'cross':
-                            if prev is not None:
-                                gantt.append([prev, (start, time+timedelta(days=-day_idx))])
-                            start = time+timedelta(days=-day_idx)
-                        wind_pizza[0] += 1
-                        prev = 'cross'
-                    elif -22.5 < rel_head < 22.5:
-                        if prev != 'good':
-                            if prev is not None:
-                                gantt.append([prev, (start, time+timedelta(days=-day_idx))])
-                            start = time+timedelta(days=-day_idx)
-                        wind_pizza[1] += 1
-                        prev = 'good'
-                    elif  22.5 < rel_head < point['head_range'][1]:
-                        if prev != 'cross':
-                            if prev is not None:
-                                gantt.append([prev, (start, time+timedelta(days=-day_idx))])
-                            start = time+timedelta(days=-day_idx)
-                        wind_pizza[2] += 1
-                        prev = 'cross'
-                    else:
-                        if prev != 'no':
-                            if prev is not None:
-                                gantt.append([prev, (start, time+timedelta(days=-day_idx))])
-                            start = time+timedelta(days=-day_idx)
-                        prev = 'no' 
-                else:
-                    if prev != 'no':
-                        if prev is not None:
-                            gantt.append([prev, (start, time+timedelta(days=-day_idx))])
-                        start = time+timedelta(days=-day_idx)
-                    prev = 'no' 
-                last_time = time
-            gantt.append([prev, (start, last_time+timedelta(days=-day_idx))])         
-
-            good_hours = wind_pizza[1]
-            cross_hours = wind_pizza[0] + wind_pizza[2]
-            day_forecast.append({"gantt": gantt, "wind_pizza": wind_pizza, "good_hours": good_hours, "cross_hours": cross_hours})
-        disp_forecast.append(day_forecast)
-    return disp_forecast
+async def process_soar_forecast(raw_forecasts):
+    with METRICS.span("process_soar_forecast"):
+        dates = forecast_dates(next(iter(raw_forecasts.values())))
+
+        store = build_forecast_store(raw_forecasts, dates, SOAR_VARIABLES)
+        store.freeze()
+        return {model: store.model(model) for model in raw_forecasts}
+
+
+async def process_therm_forecast(raw_forecast):
+    dates = forecast_dates(raw_forecast)
+    return slice_days(raw_forecast, dates, THERM_VARIABLES)
+
+NO, CROSS_LEFT, GOOD, CROSS_RIGHT = 0, 1, 2, 3
+GANTT_CLASS = np.array([0, 1, 2, 1], dtype=np.int8)
+GANTT_LABELS = ['no', 'cross', 'good']
+
+def score_soar(block, points, time_range):
+    """Classify every (point, hour) of a block as no/cross/good flying"""
+    wind_min = np.array([point['wind_range'][0] for point in points], dtype=np.float32)[:, None]
+    wind_max = np.array([point['wind_range'][1] for point in points], dtype=np.float32)[:, None]
+    heading = np.array([point['heading'] for point in points], dtype=np.float32)[:, None]
+    head_min = np.array([point['head_range'][0] for point in points], dtype=np.float32)[:, None]
+    head_max = np.array([point['head_range'][1] for point in points], dtype=np.float32)[:, None]
+
+    minutes = (block["time"] // 60_000_000_000) % 1440
+    window = (time_range[0].hour*60 + time_range[0].minute < minutes) \
+           & (minutes < time_range[1].hour*60 + time_range[1].minute)
+
+    flyable = window \
+            & (block["precipitation"] < 0.01) \
+            & (block["visibility"] > 99) \
+            & (block["wind_speed"] > wind_min) \
+            & (block["wind_gusts"] < wind_max)
+
+    rel_head = block["wind_direction"] - heading
+    side = np.full(rel_head.shape, NO, dtype=np.int8)
+    side[(head_min < rel_head) & (rel_head < -22.5)] = CROSS_LEFT
+    side[(-22.5 < rel_head) & (rel_head < 22.5)] = GOOD
+    side[(22.5 < rel_head) & (rel_head < head_max)] = CROSS_RIGHT
+    side[~flyable] = NO
+    return side
+
+DAY_NS = 86_400_000_000_000
+
+def gantt_segments(side, time, starts, stops):
+    """Run-length encoded gantt class of every (row, day) window [start, stop) in one pass.
+
+    Returns segments and offsets: the rows of window (i, day) are segments[offsets[i, day]:offsets[i, day + 1]],
+    each (class, start, end) with start and end in ns, shifted back by day days onto the first day. Segments end
+    where the next one starts, the last one at stop - 1. Only best_spot_summary boxes them into Timestamps.
+    """
+    n_rows, n_days = starts.shape
+    gantt_class = GANTT_CLASS[side]
+    # changed[i, t]: a new segment starts at hour t, cumulative counts locate them per window
+    changed = np.zeros(gantt_class.shape, dtype=bool)
+    changed[:, 1:] = gantt_class[:, 1:] != gantt_class[:, :-1]
+    cumulative = np.zeros((n_rows, gantt_class.shape[1] + 1), dtype=np.int64)
+    np.cumsum(changed, axis=1, out=cumulative[:, 1:])
+    boundaries = np.flatnonzero(changed) % gantt_class.shape[1]
+    row_base = np.concatenate(([0], np.cumsum(cumulative[:, -1])[:-1]))
+
+    rows = np.arange(n_rows)[:, None]
+    empty = stops <= starts
+    first_inner = cumulative[rows, np.minimum(starts + 1, stops)]
+    counts = np.where(empty, 0, 1 + cumulative[rows, stops] - first_inner)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    window = np.repeat(np.arange(n_rows*n_days), counts.ravel())
+    k = np.arange(offsets[-1]) - offsets[:-1][window]
+    row, day = window // n_days, window % n_days
+    inner = row_base[row] + first_inner.ravel()[window] + k - 1
+    seg_start = np.where(k == 0, starts.ravel()[window], boundaries[np.maximum(inner, 0)] if len(boundaries) else 0)
+    last = k == counts.ravel()[window] - 1
+    seg_end = np.where(last, stops.ravel()[window] - 1, np.roll(seg_start, -1))
+
+    shift = -day*DAY_NS
+    segments = np.column_stack((gantt_class[row, seg_start], time[seg_start] + shift, time[seg_end] + shift))
+    segments.flags.writeable = False
+    return segments, offsets.reshape(-1)
+
+def count_hours(side, label, starts, stops):
+    # Hours of one class per (row, day) from a cumulative sum over the full axis
+    cumulative = np.zeros((side.shape[0], side.shape[1] + 1), dtype=np.int32)
+    np.cumsum(side == label, axis=1, out=cumulative[:, 1:])
+    rows = np.arange(side.shape[0])[:, None]
+    return cumulative[rows, stops] - cumulative[rows, starts]
+
+# (block hash, day index, point settings, time range) -> display entry, shared by all sessions and refreshes
+DISPLAY_CACHE = LruCache(maxsize=4096, name="display")
+# display_soar sizes the cache to models x points x days x DISPLAY_TIME_RANGES, within these bounds
+DISPLAY_TIME_RANGES = 4
+MIN_DISPLAY_ENTRIES = 4096
+MAX_DISPLAY_ENTRIES = 200_000
+
+def point_settings(point):
+    return tuple(point['wind_range']), point['heading'], tuple(point['head_range'])
+
+def forecast_display_soar(forecasts, points, time_range):
+    with METRICS.span("forecast_display_soar"):
+        return display_soar(forecasts, points, time_range)
+
+def display_soar(forecasts, points, time_range):
+    # Rows are (model, point), only rows with a block that has not been displayed before are scored
+    models = list(forecasts)
+    store = forecasts[models[0]].store
+    m_idx = [forecasts[model].m for model in models]
+    n_models, n_points, n_days = len(models), store.data.shape[1], len(store.dates)
+    points = list(points)*n_models
+    time_range = tuple(time_range)
+    DISPLAY_CACHE.resize(min(max(n_models*n_points*n_days*DISPLAY_TIME_RANGES, MIN_DISPLAY_ENTRIES), MAX_DISPLAY_ENTRIES))
+
+    hashes = store.hashes[m_idx].reshape(n_models*n_points, -1)
+    keys = [[(int(hashes[row, day]), day, point_settings(points[row]), time_range) for day in range(n_days)]
+            for row in range(n_models*n_points)]
+    entries = [[DISPLAY_CACHE.get(key) for key in row_keys] for row_keys in keys]
+    stale = [row for row, row_entries in enumerate(entries) if None in row_entries]
+    METRICS.count("display_rows_scored", len(stale))
+
+    if stale:
+        data = store.data[m_idx].reshape(n_models*n_points, len(store.time), -1)[stale]
+        block = {variable: data[..., store.variable(variable)]
+                 for variable in ["precipitation", "visibility", "wind_speed", "wind_gusts", "wind_direction"]}
+        block["time"] = store.time[None, :]
+        side = score_soar(block, [points[row] for row in stale], time_range)
+
+        starts = store.starts[m_idx].reshape(n_models*n_points, -1)[stale]
+        stops = store.stops[m_idx].reshape(n_models*n_points, -1)[stale]
+        wind_pizza = np.stack([count_hours(side, CROSS_LEFT, starts, stops),
+                               count_hours(side, GOOD, starts, stops),
+                               count_hours(side, CROSS_RIGHT, starts, stops)], axis=-1).astype(float)
+        wind_pizza.flags.writeable = False
+        segments, offsets = gantt_segments(side, store.time, starts, stops)
+
+        for i, row in enumerate(stale):
+            for day_idx in range(n_days):
+                if entries[row][day_idx] is not None:
+                    continue
+                entries[row][day_idx] = {
+                    "gantt": segments[offsets[i*n_days + day_idx]:offsets[i*n_days + day_idx + 1]],
+                    "wind_pizza": wind_pizza[i, day_idx],
+                    "good_hours": wind_pizza[i, day_idx, 1],
+                    "cross_hours": wind_pizza[i, day_idx, 0] + wind_pizza[i, day_idx, 2]
+                }
+                DISPLAY_CACHE.put(keys[row][day_idx], entries[row][day_idx])
+
+    return {model: [[entries[m*n_points + p][day_idx] for p in range(n_points)] for day_idx in range(n_days)]
+            for m, model in enumerate(models)}
+
+GANTT_WIND = {'no': 'Not flyable', 'good': 'Good', 'cross': 'Cross'}
+
+def best_spot_summary(disp_forecast, points, day_labels):
+    """Best point of every day per model with its hours and Gantt rows, ready for the map tab"""
+    summary = {}
+    for model, forecast in disp_forecast.items():
+        good = np.array([[pf['good_hours'] for pf in day] for day in forecast])
+        cross = np.array([[pf['cross_hours'] for pf in day] for day in forecast])
+        flyable = good + cross
+        # Most good hours wins, days without any fall back to the most flyable hours (first point on ties)
+        best = np.where(good.max(axis=1) > 0, good.argmax(axis=1), flyable.argmax(axis=1))
+        days = np.arange(len(forecast))
+
+        gantt = [dict(Wind=GANTT_WIND[GANTT_LABELS[label]], Point='' if label == NO else points[best[day]]['name'],
+                      Start=pd.Timestamp(start, tz="UTC"), Finish=pd.Timestamp(finish, tz="UTC"), Day=day_labels[day])
+                 for day in days for label, start, finish in forecast[day][best[day]]['gantt'].tolist()]
+        summary[model] = {
+            "best": best,
+            "good_hours": good[days, best],
+            "cross_hours": cross[days, best],
+            "total_hours": flyable[days, best],
+            "gantt": pd.DataFrame(gantt)[::-1]
+        }
+    return summary
 
-def forecast_display_therm(forecast):
+def forecast_display_therm(forecast, points):
     disp_forecast = []
     for day in forecast:
         day_forecast = []
         for i, point_forecast in enumerate(day):
-            point = st.session_state.soar_points[i]
+            point = points[i]
             for i, time in enumerate(point_forecast["time"]):
                 flyable_hours = 0
                 thermal_hours = 0
@@ -339,15 +275,3 @@ def forecast_display_therm(forecast):
             day_forecast.append({"flyable_hours": flyable_hours, "thermal_hours": thermal_hours})
         disp_forecast.append(day_forecast)
     return disp_forecast
-
-def start_day(daily, point):
-    return daily[point]["sunrise"]+timedelta(hours=-1)
-
-def end_day(daily, point):
-    return daily[point]["sunset"]+timedelta(hours=2)
-
-def start_window(time):
-    return time.replace(hour=st.session_state.user.time_range[0].hour, minute=st.session_state.user.time_range[0].minute)
-
-def end_window(time):
-    return time.replace(hour=st.session_state.user.time_range[1].hour, minute=st.session_state.user.time_range[1].minute)
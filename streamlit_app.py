@@ -1,20 +1,17 @@
 import streamlit as st
-import asyncio
 import nest_asyncio
+import os
 import traceback
 
-from datetime import datetime, time
-from os import path
+from datetime import datetime, time, timedelta
 from streamlit_cookies_controller import CookieController
 from dotmap import DotMap
-from time import sleep
 from streamlit_javascript import st_javascript
 
-from backend import *
-from tab_map_forecast import disp_map_forecast
-from tab_edit_points import disp_edit_points
-from tab_point_forecast import disp_point_forecast
-from tab_settings import disp_settings
+from backend import load_points, forecast_provider, measurement_provider, profile_store, refresh_scheduler, day_labels, make_disp_forecast
+from user_store import USER_COOKIE, new_user_id, legacy_profile
+
+# Tab modules are imported when their tab is first selected, folium and plotly load with them
 
 # Monkey patch Streamlit's internal event loop
 nest_asyncio.apply()
@@ -35,54 +32,29 @@ if st_theme == "dark":
 else:
     st.session_state.dark_theme = False
 
-cookies = CookieController()
-
 if 'user' not in st.session_state:
-    try:
-        user_data_cookies = {cookie: cookies.get(cookie) for cookie in ["user_model", "user_time_range"]}
-        sleep(0.7)
-    except:
-        user_data_cookies = {}
-    
-    user_data = {}
-
-    for key in user_data_cookies:
-        if key.startswith("user_"):
-            user_data[key.lstrip("user_")] = user_data_cookies[key]
-    
-    if 'time_range' in user_data and user_data['time_range'] is not None:
-        user_data['time_range'] = (time.fromisoformat(user_data['time_range'][0]), time.fromisoformat(user_data['time_range'][1]))
-        st.session_state.user = DotMap(user_data)
-    else:
-        st.session_state.user = DotMap()
+    # The profile id comes with the page request, settings are read from the server side store
+    store = profile_store()
+    user_id = st.context.cookies.get(USER_COOKIE)
+    if not user_id:
+        user_id = new_user_id()
+        CookieController().set(USER_COOKIE, user_id, expires=datetime.now()+timedelta(days=360))
+        profile = legacy_profile(st.context.cookies)
+        if profile:
+            store.put(user_id, profile)
+    st.session_state.user_id = user_id
+    st.session_state.user = DotMap(store.get(user_id))
 
 st.session_state.time = datetime.now()
 
-if 'remove_forecast' not in st.session_state:
-    st.session_state.remove_forecast = False
-
-if 'forecast' not in st.session_state and path.isfile("forecast.pkl"):
-    load_forecast()
-
-if st.session_state.remove_forecast:
-    try:
-        remove("forecast.pkl")
-        st.session_state.remove_forecast = False
-    except:
-        pass
-
-if 'remove_measurements' not in st.session_state:
-    st.session_state.remove_measurements = False
+provider = forecast_provider()
+meas_provider = measurement_provider()
+refresh_scheduler()
 
-if 'measurements' not in st.session_state and path.isfile("measurements.pkl"):
-    load_measurements()
-
-if st.session_state.remove_measurements:
-    try:
-        remove("measurements.pkl")
-        st.session_state.remove_measurements = False
-    except:
-        pass
+if 'forecast_version' not in st.session_state:
+    st.session_state.forecast_version = None
+if 'measurements_version' not in st.session_state:
+    st.session_state.measurements_version = None
 
 if 'soar_points' not in st.session_state:
     load_points()
@@ -102,55 +74,40 @@ if 'selected_point_idx' not in st.session_state:
     st.session_state.selected_point_idx = 0
 if 'selected_date_idx' not in st.session_state:
     st.session_state.selected_date_idx = 1
-if 'update_forecast' not in st.session_state:
-    st.session_state.update_forecast = False
-if 'update_measurements' not in st.session_state:
-    st.session_state.update_measurements = False
-if 'updating_forecast' not in st.session_state:
-    st.session_state.updating_forecast = False
-if 'updating_measurements' not in st.session_state:
-    st.session_state.updating_measurements = False
 if 'update_disp_forecast' not in st.session_state:
     st.session_state.update_disp_forecast = False
 
-if 'forecast' in st.session_state and 'time' in st.session_state.forecast:
-    if (st.session_state.time - st.session_state.forecast['time']).total_seconds() >= 3600:
-        print("update forecast")
-        st.session_state.update_forecast = True
-    else:
-        st.session_state.update_forecast = False
+# Render the last good snapshot right away, only a cold start without any snapshot waits for a fetch
+if provider.snapshot is None or meas_provider.snapshot is None:
+    with st.spinner("Fetching forecast..."):
+        provider.latest()
+        meas_provider.latest()
 
-if 'measurements' in st.session_state and 'time' in st.session_state.measurements:
-    if (st.session_state.time - st.session_state.measurements['time']).total_seconds() >= 900:
-        print("update_measurements")
-        st.session_state.update_measurements = True
-    else:
-        st.session_state.update_measurements = False
+# The background scheduler swaps in new snapshots at any time, read each one once so data and version match
+snapshot = provider.snapshot
+meas_snapshot = meas_provider.snapshot
+
+# New snapshots are picked up on the next rerun
+st.session_state.update_forecast = snapshot.version != st.session_state.forecast_version
 
 if 'current_date' not in st.session_state or st.session_state.update_forecast:
     st.session_state.current_date = datetime.now().date()
 
 # Date selector at the top
 if 'day_list' not in st.session_state or st.session_state.update_forecast:
-    week_day = datetime.today().weekday()
-    week_days_list = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    st.session_state.day_list = ["Yesterday", "Today", "Tomorrow", week_days_list[(week_day+2)%7], week_days_list[(week_day+3)%7], week_days_list[(week_day+4)%7], week_days_list[(week_day+5)%7], week_days_list[(week_day+6)%7]]
+    st.session_state.day_list = day_labels()
 
 if 'mode' not in st.session_state.user:
     st.session_state.user.mode = 'soar'
 
-# Initialize forecast data if not already loaded
-if 'forecast' not in st.session_state or len(st.session_state.forecast) == 0:
-    st.session_state.update_forecast = True
-
-if 'measurements' not in st.session_state or len(st.session_state.measurements) == 0:
-    st.session_state.update_measurements = True  
-
 if 'disp_forecast' not in st.session_state or len(st.session_state.disp_forecast) == 0:
     st.session_state.update_disp_forecast = True
 
 # Create tabs
 tabs=["Map Forecast", "Point Forecast", "Settings"] #"Edit Points (not working yet)", 
+# Stage timings and cache statistics, for operators only: ?admin=1 or SOAR_ADMIN set on the server
+if st.query_params.get("admin") or os.environ.get("SOAR_ADMIN"):
+    tabs.append("Admin")
 
 tab = st.segmented_control(
     'Tabs',
@@ -173,17 +130,25 @@ if selected_date_idx != st.session_state.selected_date_idx:
     st.session_state.selected_date_idx = selected_date_idx
 
 #Update forecasts
-if st.session_state.update_forecast and not st.session_state.updating_forecast:
+if st.session_state.update_forecast:
     st.session_state.update_forecast = False
-    st.session_state.updating_forecast = True
-    print("updating forecast")
-    asyncio.run(make_forecast())
+    st.session_state.forecast = snapshot.data
+    st.session_state.forecast_version = snapshot.version
+    st.session_state.update_disp_forecast = True
+
+if meas_snapshot.version != st.session_state.measurements_version:
+    st.session_state.measurements = meas_snapshot.data
+    st.session_state.measurements_version = meas_snapshot.version
 
-if st.session_state.update_measurements and not st.session_state.updating_measurements:
-    st.session_state.update_measurements = False
-    st.session_state.updating_measurements = True
-    print("updating measurements")
-    asyncio.run(make_measurements())
+@st.fragment(run_every=60)
+def disp_data_age():
+    # Keep the age indicator current and rerun the page once newer data has landed
+    if provider.version != st.session_state.forecast_version \
+    or meas_provider.version != st.session_state.measurements_version:
+        st.rerun(scope='app')
+    st.caption(f"Forecast updated {int(provider.age()//60)} min ago, measurements updated {int(meas_provider.age()//60)} min ago")
+
+disp_data_age()
 
 if 'forecast' in st.session_state and st.session_state.update_disp_forecast:
     make_disp_forecast()
@@ -191,6 +156,7 @@ if 'forecast' in st.session_state and st.session_state.update_disp_forecast:
 if tab == tabs[0]:
     if 'disp_forecast' in st.session_state:
         try:
+            from tab_map_forecast import disp_map_forecast
             disp_map_forecast(st.session_state)
         except Exception:
             print("Map Forecast Tab \n")
@@ -198,18 +164,27 @@ if tab == tabs[0]:
 if tab == tabs[1]:
     if 'forecast' in st.session_state:
         try:
+            from tab_point_forecast import disp_point_forecast
             disp_point_forecast(st.session_state)
         except Exception:
             print("Point Forecast Tab \n")
             traceback.print_exc()
 #if tab == tabs[2]:
+    #from tab_edit_points import disp_edit_points
     #disp_edit_points(st.session_state)
     #st.write("Feature under development!")
 if tab == tabs[2]:
     try:
         if 'soar_knmi' in st.session_state.forecast and 'soar_ecmwf' in st.session_state.forecast:
+            from tab_settings import disp_settings
             disp_settings(st.session_state)
     except Exception:
         print("Settings Tab \n")
         traceback.print_exc()
-
+if tab == "Admin":
+    try:
+        from tab_admin import disp_admin
+        disp_admin(st.session_state)
+    except Exception:
+        print("Admin Tab \n")
+        traceback.print_exc()
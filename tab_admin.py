@@ -0,0 +1,32 @@
+import streamlit as st
+import pandas as pd
+
+import lru
+
+from metrics import METRICS
+
+def disp_admin(session_state):
+    st.subheader("Stage timings")
+    spans = pd.DataFrame([
+        {"stage": stage, "labels": ", ".join(f"{key}={value}" for key, value in labels.items()),
+         "count": count, "mean ms": 1000*total/count, "max ms": 1000*longest}
+        for stage, labels, count, total, longest in METRICS.rows()
+    ])
+    st.dataframe(spans, hide_index=True)
+
+    st.subheader("Caches")
+    caches = pd.DataFrame([
+        {"cache": name, "entries": len(cache), "hits": cache.hits, "misses": cache.misses,
+         "hit ratio": cache.hits/(cache.hits + cache.misses) if cache.hits + cache.misses else None}
+        for name, cache in sorted(lru.CACHES.items())
+    ])
+    st.dataframe(caches, hide_index=True)
+
+    st.subheader("Snapshots")
+    for (gauge, labels), read in sorted(METRICS.gauges.items()):
+        value = read()
+        if value is not None:
+            st.text(f"{gauge} {dict(labels)}: {value:.0f}")
+
+    with st.expander("Prometheus export"):
+        st.code(METRICS.prometheus(), language=None)
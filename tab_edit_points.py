@@ -1,4 +1,5 @@
 import streamlit as st
+import pandas as pd
 from streamlit_folium import st_folium
 
 from make_gis_map import *
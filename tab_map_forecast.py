@@ -1,78 +1,37 @@
 import streamlit as st
 from streamlit_folium import st_folium
 import plotly.graph_objects as go
-import plotly.figure_factory as ff
 import plotly.express as px
 
-from process_forecast import *
-from make_gis_map import *
+from make_gis_map import soar_base_map, soar_map_layer, create_therm_map_forecast
 
 def disp_map_forecast(session_state):
     # Create and display map with current date's forecast
     model = "soar_knmi" if session_state.user.model == "KNMI" else "soar_ecmwf"
     
     if session_state.user.mode == 'soar':
-        current_map = create_soar_map_forecast(session_state.selected_date_idx, model=model)
+        # The base map stays put, only the layer of the points in the last reported viewport is swapped in
+        layer = soar_map_layer(session_state.selected_date_idx, model=model, view=session_state.get("map_soar"))
+        st_folium(soar_base_map(), width=500, height=450, key="map_soar", feature_group_to_add=layer,
+                  returned_objects=["bounds", "zoom"])
     else:
         current_map = create_therm_map_forecast(session_state.selected_date_idx, model=model)
-
-    st_folium(current_map, width=500, height=450, key=f"map_{session_state.selected_date_idx}")
+        st_folium(current_map, width=500, height=450, key=f"map_{session_state.selected_date_idx}")
 
     # Temperature and Precipitation Graph
     st.subheader("Flyable Hours Per Day")
     fig_flyable = go.Figure()
 
-    forecast = session_state.disp_forecast[model]
-    good_per_day = []
-    marginal_per_day = []
-    total_per_day = []
-    best_per_day = []
-    gantt_per_day = []
-    for day, date_forecast in enumerate(forecast):
-        points = []
-        max_flyable = 0
-        max_good = 0
-        best = None
-        best_flyable = None
-        for index, point_forecast in enumerate(date_forecast):
-            good = point_forecast['good_hours']
-            marginal = point_forecast['cross_hours']
-            flyable = good+marginal
-            if good > max_good:
-                max_good = good
-                best = index
-            if flyable > max_flyable:
-                max_flyable = flyable
-                best_flyable = index
-            points.append([good, marginal])
-        if best_flyable == None:
-            best_flyable = 0
-        if best == None:
-            best = best_flyable
-        good_per_day.append(points[best][0])
-        marginal_per_day.append(points[best][1])
-        total_per_day.append(points[best][0]+points[best][1])
-        best_per_day.append(best)
-        gantt_raw = date_forecast[best]['gantt']
-
-        for gantt in gantt_raw:
-            gantt_per_day.append(
-                dict(
-                    Wind='Not flyable' if gantt[0]=='no' else 'Good' if gantt[0]=='good' else 'Cross', 
-                    Point='' if gantt[0]=='no' else session_state.soar_points[best]['name'], 
-                    Start=gantt[1][0], Finish=gantt[1][1], Day=session_state.day_list[day]
-                )
-            )
-    
+    summary = session_state.disp_summary[model]
 
     if session_state.user.mode == 'soar':
-        best_point_list = [session_state.soar_points[idx]['name'] for idx in best_per_day]
+        best_point_list = [session_state.soar_points[idx]['name'] for idx in summary['best']]
     else:
-        best_point_list = [session_state.therm_points[idx]['name'] for idx in best_per_day]
+        best_point_list = [session_state.therm_points[idx]['name'] for idx in summary['best']]
 
     fig_flyable.add_trace(go.Bar(
         x=session_state.day_list,
-        y=marginal_per_day,
+        y=summary['cross_hours'],
         text=best_point_list,
         name="Crosswind",
         marker_color='orange',
@@ -81,7 +40,7 @@ def disp_map_forecast(session_state):
 
     fig_flyable.add_trace(go.Bar(
         x=session_state.day_list,
-        y=good_per_day,
+        y=summary['good_hours'],
         text=best_point_list,
         name="Good",
         marker_color='green',
@@ -96,10 +55,8 @@ def disp_map_forecast(session_state):
         )
     st.plotly_chart(fig_flyable, width='stretch', on_select='ignore')
 
-    gantt_flyable = pd.DataFrame(gantt_per_day)[::-1]
-    
     flyable = px.timeline(
-    gantt_flyable, 
+    summary['gantt'], 
     x_start="Start", 
     x_end="Finish", 
     y="Day",
@@ -1,28 +1,35 @@
 import streamlit as st
-import numpy as np
+import json
 import plotly.graph_objects as go
 
 from datetime import timedelta
 
-from process_forecast import *
+from lru import LruCache
+from metrics import METRICS
+from measurement_buffer import lttb
+
+# Wind, direction and temperature figures per point and day, rebuilt when a new snapshot lands
+FIGURE_CACHE = LruCache(maxsize=256, name="figures")
+MAX_PLOT_POINTS = 500
+
+def measured(station, quantity, before, after):
+    # Contiguous datetime64/float32 slices of the station index, long windows are downsampled
+    times, values = station["index"].window(quantity, before, after)
+    return lttb(times, values, MAX_PLOT_POINTS)
 
 def disp_point_forecast(session_state):
 
-    # Point selection
-    if session_state.user.mode == 'soar':
-        point_options = [point['name'] for point in session_state.soar_points]
-    else:
-        point_options = [point['name'] for point in session_state.therm_points]
-    
-    select_point = st.selectbox(
+    # Point selection, options are positions so the selection needs no lookup by name
+    points = session_state.soar_points if session_state.user.mode == 'soar' else session_state.therm_points
+
+    selected_point_idx = st.selectbox(
         "Select Point",
-        options=point_options,
+        options=range(len(points)),
+        format_func=lambda idx: points[idx]['name'],
         index=session_state.selected_point_idx,
         key="select_point"
     )
 
-    selected_point_idx = point_options.index(select_point)
-
     if session_state.selected_point_idx != selected_point_idx:
         session_state.selected_point_idx = selected_point_idx
 
@@ -38,211 +45,218 @@ def disp_point_forecast(session_state):
 
     button_location = st.link_button('Directions (Google Maps)', rf"https://www.google.com/maps/place/{selected_point['lat']}N+{selected_point['lon']}E")
 
-    if day_forecast["time"]:
-    
-        # Wind Speed and Gust Speed Graph
-        st.subheader("Wind Speed and Gusts")
-        fig_wind = go.Figure()
-
-        fig_wind.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["wind_speed"],
-            name="Wind Speed",
-            line=dict(color='blue', width=0),
-            line_shape='spline',
-            fill='tonexty',
-            fillcolor="blue",
-            yaxis="y1",
-            opacity=0,
-            mode="lines"
-        ))
+    if len(day_forecast["time"]):
+        key = (model, session_state.user.mode, session_state.selected_date_idx, session_state.selected_point_idx,
+               session_state.forecast_version, session_state.measurements_version, st.session_state.dark_theme,
+               json.dumps(selected_point, sort_keys=True))
+        figures = FIGURE_CACHE.get(key)
+        if figures is None:
+            with METRICS.span("figure_build"):
+                figures = point_figures(session_state, selected_point, day_forecast)
+            FIGURE_CACHE.put(key, figures)
+        fig_wind, fig_dir, fig_temp_precip = figures
 
-        fig_wind.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["wind_gusts"],
-            name="Gust Speed",
-            line=dict(color='orange', width=0),
-            line_shape='spline',
-            fill='tonexty',
-            fillcolor="orange",
-            yaxis="y1",
-            opacity=0,
-            mode="lines"
-        ))
+        st.subheader("Wind Speed and Gusts")
+        st.plotly_chart(fig_wind, width='stretch', on_select='ignore')
 
-        fig_wind.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["precipitation"],
-            name="Precipitation",
-            line=dict(color='lightblue', width=0),
-            line_shape='spline',
-            fill='tonexty',
-            fillcolor='lightblue',
-            mode="lines",
-            yaxis="y2",
-            opacity=0
-        ))
+        st.subheader("Wind Direction")
+        st.plotly_chart(fig_dir, width='stretch', on_select='ignore')
 
-        #Get measurements
-        sunrise = (day_forecast["sunrise"]).replace(minute=0, second=0, microsecond=0)+timedelta(hours=-1)
-        sunset = (day_forecast["sunset"]).replace(minute=0, second=0, microsecond=0)+timedelta(hours=1)
+        st.subheader("Temperature and Visibility")
+        st.plotly_chart(fig_temp_precip, width='stretch', on_select='ignore')
 
-        if selected_point["station"] not in session_state.measurements:
-            st.session_state.remove_measurements = True
+        st.write(f"Weather station \"{session_state.measurements[selected_point['station']]['name']}\" used for measured data at {selected_point['name']} at \n{session_state.measurements[selected_point['station']]['lat']}°N, {session_state.measurements[selected_point['station']]['lon']}°E",
+                 f"\n\nForecast point requested offshore at \n{selected_point['lat']}°N, {selected_point['lon']}°E. Actual forecast point depends on the model and its resolution.")
 
-        wind_meas = session_state.measurements[selected_point["station"]]["WINDSHD"].truncate(before=sunrise, after=sunset)
+def point_figures(session_state, selected_point, day_forecast):
+
+    # Wind Speed and Gust Speed Graph
+    fig_wind = go.Figure()
+
+    fig_wind.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["wind_speed"],
+        name="Wind Speed",
+        line=dict(color='blue', width=0),
+        line_shape='spline',
+        fill='tonexty',
+        fillcolor="blue",
+        yaxis="y1",
+        opacity=0,
+        mode="lines"
+    ))
+
+    fig_wind.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["wind_gusts"],
+        name="Gust Speed",
+        line=dict(color='orange', width=0),
+        line_shape='spline',
+        fill='tonexty',
+        fillcolor="orange",
+        yaxis="y1",
+        opacity=0,
+        mode="lines"
+    ))
+
+    fig_wind.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["precipitation"],
+        name="Precipitation",
+        line=dict(color='lightblue', width=0),
+        line_shape='spline',
+        fill='tonexty',
+        fillcolor='lightblue',
+        mode="lines",
+        yaxis="y2",
+        opacity=0
+    ))
+
+    #Get measurements
+    sunrise = (day_forecast["sunrise"]).replace(minute=0, second=0, microsecond=0)+timedelta(hours=-1)
+    sunset = (day_forecast["sunset"]).replace(minute=0, second=0, microsecond=0)+timedelta(hours=1)
+
+    wind_time, wind_meas = measured(session_state.measurements[selected_point["station"]], "WINDSHD", sunrise, sunset)
+
+    fig_wind.add_trace(go.Scatter(
+        x=wind_time,
+        y=wind_meas*3.6,
+        name="Measured Windspeed",
+        marker=dict(color='white' if st.session_state.dark_theme else 'black', size=2.5),
+        yaxis="y1",
+        opacity=1,
+        mode="markers"
+    ))
+
+    if "WINDST" in session_state.measurements[selected_point["station"]]:
+        
+        gust_time, gust_meas = measured(session_state.measurements[selected_point["station"]], "WINDST", sunrise, sunset)
 
         fig_wind.add_trace(go.Scatter(
-            x=wind_meas.index.to_pydatetime(), 
-            y=np.asarray(wind_meas['Meetwaarde.Waarde_Numeriek'].values.tolist())*3.6,
-            name="Measured Windspeed",
+            x=gust_time,
+            y=gust_meas*3.6,
+            name="Measured Gusts",
             marker=dict(color='white' if st.session_state.dark_theme else 'black', size=2.5),
             yaxis="y1",
             opacity=1,
             mode="markers"
         ))
 
-        if "WINDST" in session_state.measurements[selected_point["station"]]:
-            
-            gust_meas = session_state.measurements[selected_point["station"]]["WINDST"].truncate(before=sunrise, after=sunset)
-
-            fig_wind.add_trace(go.Scatter(
-                x=gust_meas.index.to_pydatetime(), 
-                y=np.asarray(gust_meas['Meetwaarde.Waarde_Numeriek'].values.tolist())*3.6,
-                name="Measured Gusts",
-                marker=dict(color='white' if st.session_state.dark_theme else 'black', size=2.5),
-                yaxis="y1",
-                opacity=1,
-                mode="markers"
-            ))
-
-        if session_state.user.mode == 'soar':
-            fig_wind.add_hrect(y0=selected_point['wind_range'][0], y1=selected_point['wind_range'][1],
-                                fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
-        else:  # Thermal
-            max_wind = selected_point.get("max_wind_speed", 30)
-            fig_wind.add_hrect(y0=0, y1=max_wind, fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
-
-        fig_wind.update_xaxes(range=[sunrise+timedelta(hours=1), sunset+timedelta(hours=1)])
-
-        fig_wind.update_layout(
-            title="Wind Speed and Gusts",
-            xaxis=dict(title="Time", fixedrange=True),
-            yaxis=dict(title="Speed (km/h)", side="left", fixedrange=True),
-            yaxis2=dict(title="Precipitation (mm)", overlaying="y", side="right", fixedrange=True),
-            hovermode="x unified",
-            height=400,
-            legend=dict(orientation="h")
-        )
-
-        st.plotly_chart(fig_wind, width='stretch', on_select='ignore')
-
-        # Wind Direction Graph
-        st.subheader("Wind Direction")
-        fig_dir = go.Figure()
-
-        if session_state.user.mode == 'soar':
-            lower_bound = selected_point["heading"] + selected_point["head_range"][0]
-            lower_ideal = selected_point["heading"] - 22.5
-            upper_ideal = selected_point["heading"] + 22.5
-            upper_bound = selected_point["heading"] + selected_point["head_range"][1]
-
-            fig_dir.add_hrect(y0=lower_ideal, y1=upper_ideal, fillcolor="rgba(153,255,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
-            fig_dir.add_hrect(y0=lower_bound, y1=lower_ideal, fillcolor="rgba(255,153,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
-            fig_dir.add_hrect(y0=upper_ideal, y1=upper_bound, fillcolor="rgba(255,153,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
-        else:  # Thermal
-            start_heading = selected_point.get("start_heading_range", 0)
-            end_heading = selected_point.get("end_heading_range", 360)
-            if start_heading <= end_heading:
-                fig_dir.add_hrect(y0=start_heading, y1=end_heading,
-                                fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
-            else:
-                fig_dir.add_hrect(y0=start_heading, y1=360,
-                                fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
-                fig_dir.add_hrect(y0=0, y1=end_heading,
-                                fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
-
-        fig_dir.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["wind_direction"],
-            name="Wind Direction",
-            line=dict(color='white' if st.session_state.dark_theme else 'black', width=2, dash='dash'),
-            line_shape='spline',
-            yaxis="y1",
-            mode="lines"
-        ))
-
-        #get measurements
-        head_meas = session_state.measurements[selected_point["station"]]["WINDRTG"].truncate(before=sunrise, after=sunset)
-
-        fig_dir.add_trace(go.Scatter(
-            x=head_meas.index.to_pydatetime(),
-            y=np.asarray(head_meas['Meetwaarde.Waarde_Numeriek'].values.tolist()),
-            name="Wind Direction",
-            line=dict(color='white' if st.session_state.dark_theme else 'black', width=1),
-            line_shape='linear',
-            yaxis="y1",
-            mode="lines"
-        ))
-
-        if session_state.user.mode == 'soar':
-            fig_dir.add_hline(y=selected_point["heading"], line_dash="dot", line_color="grey",
-                            annotation_text=f"Ideal ({selected_point['heading']}°)")
-
-        fig_dir.update_layout(
-            title=f"Wind Direction (Acceptable Range)",
-            xaxis=dict(title="Time", fixedrange=True),
-            yaxis=dict(title="Direction (°)", fixedrange=True),
-            hovermode="x unified",
-            height=400,
-            legend=dict(orientation="h")
-        )
-
-        st.plotly_chart(fig_dir, width='stretch', on_select='ignore')
-
-        # Temperature and Precipitation Graph
-        st.subheader("Temperature and Visibility")
-        fig_temp_precip = go.Figure()
-
-        fig_temp_precip.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["temperature"],
-            name="Temperature",
-            line=dict(color='orange', width=2),
-            yaxis="y1",
-            line_shape='spline',
-            mode="lines"
-        ))
-
-        fig_temp_precip.add_trace(go.Scatter(
-            x=day_forecast["time"],
-            y=day_forecast["visibility"],
-            name="Visibility",
-            line=dict(color='white' if st.session_state.dark_theme else 'black', width=2),
-            yaxis="y2",
-            line_shape='spline',
-            mode="lines"
-        ))
+    if session_state.user.mode == 'soar':
+        fig_wind.add_hrect(y0=selected_point['wind_range'][0], y1=selected_point['wind_range'][1],
+                            fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
+    else:  # Thermal
+        max_wind = selected_point.get("max_wind_speed", 30)
+        fig_wind.add_hrect(y0=0, y1=max_wind, fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
+
+    fig_wind.update_xaxes(range=[sunrise+timedelta(hours=1), sunset+timedelta(hours=1)])
+
+    fig_wind.update_layout(
+        title="Wind Speed and Gusts",
+        xaxis=dict(title="Time", fixedrange=True),
+        yaxis=dict(title="Speed (km/h)", side="left", fixedrange=True),
+        yaxis2=dict(title="Precipitation (mm)", overlaying="y", side="right", fixedrange=True),
+        hovermode="x unified",
+        height=400,
+        legend=dict(orientation="h")
+    )
 
-        # Add visibility threshold line
-        visibility_threshold = 100 if session_state.user.mode == 'soar' else 0.5
-        fig_temp_precip.add_hline(y=visibility_threshold, line_dash="dot", line_color="red",
-                                annotation_text=f"Min Visibility: {visibility_threshold}", yref="y2")
-
-        fig_temp_precip.update_layout(
-            title="Temperature and Visibility",
-            xaxis=dict(title="Time", fixedrange=True),
-            yaxis=dict(title="Temperature (°C)", side="left", fixedrange=True),
-            yaxis2=dict(title="Visibility (m)", overlaying="y", side="right", fixedrange=True),
-            hovermode="x unified",
-            height=400,
-            legend=dict(orientation="h")
-        )
+    # Wind Direction Graph
+    fig_dir = go.Figure()
 
-        st.plotly_chart(fig_temp_precip, width='stretch', on_select='ignore')
+    if session_state.user.mode == 'soar':
+        lower_bound = selected_point["heading"] + selected_point["head_range"][0]
+        lower_ideal = selected_point["heading"] - 22.5
+        upper_ideal = selected_point["heading"] + 22.5
+        upper_bound = selected_point["heading"] + selected_point["head_range"][1]
+
+        fig_dir.add_hrect(y0=lower_ideal, y1=upper_ideal, fillcolor="rgba(153,255,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
+        fig_dir.add_hrect(y0=lower_bound, y1=lower_ideal, fillcolor="rgba(255,153,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
+        fig_dir.add_hrect(y0=upper_ideal, y1=upper_bound, fillcolor="rgba(255,153,51,0.7)", opacity=0.8 if st.session_state.dark_theme else 0.5, line_width=0)
+    else:  # Thermal
+        start_heading = selected_point.get("start_heading_range", 0)
+        end_heading = selected_point.get("end_heading_range", 360)
+        if start_heading <= end_heading:
+            fig_dir.add_hrect(y0=start_heading, y1=end_heading,
+                            fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
+        else:
+            fig_dir.add_hrect(y0=start_heading, y1=360,
+                            fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
+            fig_dir.add_hrect(y0=0, y1=end_heading,
+                            fillcolor="rgba(153,255,51,0.7)", opacity=0.5, line_width=0)
+
+    fig_dir.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["wind_direction"],
+        name="Wind Direction",
+        line=dict(color='white' if st.session_state.dark_theme else 'black', width=2, dash='dash'),
+        line_shape='spline',
+        yaxis="y1",
+        mode="lines"
+    ))
+
+    #get measurements
+    head_time, head_meas = measured(session_state.measurements[selected_point["station"]], "WINDRTG", sunrise, sunset)
+
+    fig_dir.add_trace(go.Scatter(
+        x=head_time,
+        y=head_meas,
+        name="Wind Direction",
+        line=dict(color='white' if st.session_state.dark_theme else 'black', width=1),
+        line_shape='linear',
+        yaxis="y1",
+        mode="lines"
+    ))
 
-        st.write(f"Weather station \"{session_state.measurements[selected_point['station']]['name']}\" used for measured data at {selected_point['name']} at \n{session_state.measurements[selected_point['station']]['lat']}°N, {session_state.measurements[selected_point['station']]['lon']}°E",
-                 f"\n\nForecast point requested offshore at \n{selected_point['lat']}°N, {selected_point['lon']}°E. Actual forecast point depends on the model and its resolution.")
+    if session_state.user.mode == 'soar':
+        fig_dir.add_hline(y=selected_point["heading"], line_dash="dot", line_color="grey",
+                        annotation_text=f"Ideal ({selected_point['heading']}°)")
+
+    fig_dir.update_layout(
+        title=f"Wind Direction (Acceptable Range)",
+        xaxis=dict(title="Time", fixedrange=True),
+        yaxis=dict(title="Direction (°)", fixedrange=True),
+        hovermode="x unified",
+        height=400,
+        legend=dict(orientation="h")
+    )
 
+    # Temperature and Precipitation Graph
+    fig_temp_precip = go.Figure()
+
+    fig_temp_precip.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["temperature"],
+        name="Temperature",
+        line=dict(color='orange', width=2),
+        yaxis="y1",
+        line_shape='spline',
+        mode="lines"
+    ))
+
+    fig_temp_precip.add_trace(go.Scatter(
+        x=day_forecast["time"],
+        y=day_forecast["visibility"],
+        name="Visibility",
+        line=dict(color='white' if st.session_state.dark_theme else 'black', width=2),
+        yaxis="y2",
+        line_shape='spline',
+        mode="lines"
+    ))
+
+    # Add visibility threshold line
+    visibility_threshold = 100 if session_state.user.mode == 'soar' else 0.5
+    fig_temp_precip.add_hline(y=visibility_threshold, line_dash="dot", line_color="red",
+                            annotation_text=f"Min Visibility: {visibility_threshold}", yref="y2")
+
+    fig_temp_precip.update_layout(
+        title="Temperature and Visibility",
+        xaxis=dict(title="Time", fixedrange=True),
+        yaxis=dict(title="Temperature (°C)", side="left", fixedrange=True),
+        yaxis2=dict(title="Visibility (m)", overlaying="y", side="right", fixedrange=True),
+        hovermode="x unified",
+        height=400,
+        legend=dict(orientation="h")
+    )
 
-        
\ No newline at end of file
+    return fig_wind, fig_dir, fig_temp_precip
@@ -1,11 +1,6 @@
 import streamlit as st
 
-from datetime import datetime, timedelta
-from time import sleep
-from streamlit_cookies_controller import CookieController
-from json import dumps
-
-from json_datetime_encoder import DateTimeEncoder
+from backend import profile_store
 
 def disp_settings(session_state):
     model = st.selectbox(
@@ -39,15 +34,7 @@ def disp_settings(session_state):
     st.session_state.user.mode = 'soar' if selected_mode == 'Soar' else 'thermal'
 
     if st.button("Save Settings"):
-        with st.spinner(text="Saving settings..."):
-            cookies = CookieController()
-
-            user_data = st.session_state.user.toDict()
-            for key in user_data.keys():
-                cookies.set(name=f"user_{key}", value=dumps(user_data[key], cls=DateTimeEncoder), expires=datetime.now()+timedelta(days=360))
-
-            st.session_state.update_disp_forecast = True
-        
-        with st.spinner(text="Reloading app..."):
-            sleep(2)
-            st.rerun(scope='app')
\ No newline at end of file
+        # Stored in memory right away and written to disk in the background, the forecast is rescored on the next rerun
+        profile_store().put(session_state.user_id, session_state.user.toDict())
+        st.session_state.update_disp_forecast = True
+        st.toast("Settings saved")
\ No newline at end of file
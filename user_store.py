@@ -0,0 +1,113 @@
+import atexit
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import traceback
+
+from datetime import time
+from time import sleep
+from urllib.parse import unquote
+
+from json_datetime_encoder import DateTimeEncoder
+from lru import LruCache
+from metrics import METRICS
+
+PROFILE_DB = os.environ.get("SOAR_PROFILE_DB", "profiles.sqlite")
+# The only cookie the app sets, an opaque id of the profile on the server
+USER_COOKIE = "soar_user"
+# Cookies written per setting before profiles moved to the server, read once to migrate them
+LEGACY_COOKIES = {"model": "user_model", "time_range": "user_time_range", "mode": "user_mode"}
+
+def new_user_id():
+    return secrets.token_urlsafe(16)
+
+def encode(profile):
+    return json.dumps(profile, cls=DateTimeEncoder, sort_keys=True)
+
+def decode(text):
+    profile = json.loads(text)
+    if profile.get("time_range") is not None:
+        profile["time_range"] = tuple(time.fromisoformat(value) for value in profile["time_range"])
+    return profile
+
+def legacy_profile(cookies):
+    """Settings from the per-key cookies of earlier versions, {} when there are none"""
+    profile = {}
+    for key, cookie in LEGACY_COOKIES.items():
+        try:
+            value = json.loads(unquote(cookies[cookie]))
+        except Exception:
+            continue
+        if value is not None:
+            profile[key] = value
+    return decode(json.dumps(profile)) if profile else {}
+
+class ProfileStore:
+    """User settings by opaque user id, in memory in front of a SQLite file with write-behind.
+
+    A profile is a free-form JSON object (model, time_range, mode, per-user spot thresholds, ...).
+    get() reads the file only the first time an id is seen, put() updates memory and returns at
+    once, a daemon thread writes changed profiles after `delay` seconds, coalescing bursts of saves.
+    """
+
+    def __init__(self, path=PROFILE_DB, delay=2.0, maxsize=4096):
+        self.path = path
+        self.delay = delay
+        self.cache = LruCache(maxsize=maxsize, name="profiles")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS profiles (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._wake = threading.Event()
+        threading.Thread(target=self._write_behind, name="profile-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def get(self, user_id):
+        """Copy of the profile, {} for an unknown id"""
+        with self._lock:
+            if user_id in self._dirty:
+                return dict(self._dirty[user_id])
+        profile = self.cache.get(user_id)
+        if profile is None:
+            with self._lock:
+                row = self._db.execute("SELECT data FROM profiles WHERE id = ?", (user_id,)).fetchone()
+            profile = decode(row[0]) if row else {}
+            self.cache.put(user_id, profile)
+        return dict(profile)
+
+    def put(self, user_id, profile):
+        profile = dict(profile)
+        self.cache.put(user_id, profile)
+        with self._lock:
+            self._dirty[user_id] = profile
+        self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+            try:
+                with METRICS.span("profile_flush"):
+                    self._db.executemany("INSERT OR REPLACE INTO profiles (id, data) VALUES (?, ?)",
+                                         [(user_id, encode(profile)) for user_id, profile in dirty.items()])
+                    self._db.commit()
+            except Exception:
+                # Keep them for the next flush
+                for user_id, profile in dirty.items():
+                    self._dirty.setdefault(user_id, profile)
+                raise
+
+    def _write_behind(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            sleep(self.delay)
+            try:
+                self.flush()
+            except Exception:
+                print("Writing profiles failed \n")
+                traceback.print_exc()